@@ -0,0 +1,187 @@
+"""
+Shared URL classification and CDX helpers for crawler.py and crawler_v2.py
+"""
+
+import re
+import types
+
+import requests
+
+try:
+    import cdx_toolkit
+except ImportError:
+    cdx_toolkit = None
+
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+
+CMS_PATTERNS = {
+    'PrestaShop': [
+        'prestashop', '/modules/ps_', 'id_product=', 'blockcart',
+        '/themes/classic/', 'prestashop-ui-kit'
+    ],
+    'Magento': [
+        'magento', '/checkout/cart/', 'mage.', '/static/frontend/',
+        '/skin/frontend/', 'mage-'
+    ],
+    'WooCommerce': [
+        '/wp-content/plugins/woocommerce', 'wc-ajax', 'add-to-cart=',
+        'woocommerce', 'wc-block'
+    ],
+    'Shopify': [
+        '.myshopify.com', 'cdn.shopify', '/cart.js', 'shopify'
+    ],
+    'OpenCart': [
+        'route=product', 'route=checkout', 'opencart', 'catalog/view/theme'
+    ],
+    'VTEX': [
+        'vtex', '.vteximg.com', '/api/checkout', 'vtexcommercestable'
+    ],
+    'BigCommerce': [
+        'bigcommerce', 'cdn.bigcommerce.com'
+    ],
+    'Wix': [
+        'wix.com', 'wixsite.com', '_wix_'
+    ],
+    'Squarespace': [
+        'squarespace', 'static.squarespace.com'
+    ],
+}
+
+ECOMMERCE_KEYWORDS = [
+    'cart', 'checkout', 'buy', 'shop', 'store', 'product',
+    'catalog', 'price', 'order', 'basket', 'purchase', 'payment'
+]
+
+BAD_PATTERNS = ['example.', 'test.', 'localhost']
+
+
+def extract_domain(url):
+    p = url.find('://')
+    if p < 0:
+        return None
+    start = p + 3
+    if url.startswith('www.', start):
+        start += 4
+    end = url.find('/', start)
+    host = url[start:end] if end >= 0 else url[start:]
+    return host.lower() if host else None
+
+
+def _literal_re(words):
+    return re.compile('|'.join(map(re.escape, words)))
+
+
+# fallback matchers when pyahocorasick is missing: one compiled alternation
+# per CMS (kept in CMS_PATTERNS order) and one for the e-commerce keywords
+_CMS_RES = [(cms, _literal_re(patterns).search) for cms, patterns in CMS_PATTERNS.items()]
+_ECOM_RE = _literal_re(ECOMMERCE_KEYWORDS)
+BAD_RE = _literal_re(BAD_PATTERNS)
+
+
+def detect_cms(url_lower):
+    for cms, search in _CMS_RES:
+        if search(url_lower):
+            return cms
+    return None
+
+
+def build_url_automaton(keywords=()):
+    """One automaton over every CMS pattern, e-commerce keyword and user keyword.
+    Payload is (cms_rank, is_ecom, is_keyword); cms_rank follows CMS_PATTERNS
+    order so the first CMS in the dict still wins when several match."""
+    automaton = ahocorasick.Automaton()
+
+    def add(word, rank=None, ecom=False, kw=False):
+        old_rank, old_ecom, old_kw = automaton.get(word, (None, False, False))
+        automaton.add_word(word, (rank if old_rank is None else old_rank, ecom or old_ecom, kw or old_kw))
+
+    for rank, patterns in enumerate(CMS_PATTERNS.values()):
+        for p in patterns:
+            add(p, rank=rank)
+    for k in ECOMMERCE_KEYWORDS:
+        add(k, ecom=True)
+    for k in keywords:
+        add(k, kw=True)
+    automaton.make_automaton()
+    return automaton
+
+
+CMS_NAMES = list(CMS_PATTERNS)
+URL_AUTOMATON = build_url_automaton() if AHOCORASICK_AVAILABLE else None
+
+
+def parse_keywords(value):
+    return [k.lower() for k in value.split(',') if k] if value else []
+
+
+def classify(url_lower, automaton=URL_AUTOMATON, keywords=()):
+    """Return (cms, is_ecommerce, keyword_ok) for an already-lowercased URL in a single scan.
+    automaton must have been built with the same keywords."""
+    if automaton is None:
+        return (
+            detect_cms(url_lower),
+            _ECOM_RE.search(url_lower) is not None,
+            matches_keywords(url_lower, keywords)
+        )
+    
+    best = None
+    ecom = False
+    kw_ok = not keywords
+    for _, (rank, is_ecom, is_kw) in automaton.iter(url_lower):
+        if is_ecom:
+            ecom = True
+        if is_kw:
+            kw_ok = True
+        if rank is not None and (best is None or rank < best):
+            best = rank
+        if ecom and kw_ok and best == 0:
+            break
+    return (CMS_NAMES[best] if best is not None else None), ecom, kw_ok
+
+
+def matches_keywords(url_lower, keywords):
+    """keywords must already be lowercased (see parse_keywords)"""
+    if not keywords:
+        return True
+    return any(k in url_lower for k in keywords)
+
+
+def share_cdx_session(pool_size):
+    """cdx_toolkit fetches every index page with a bare requests.get, i.e. a new
+    connection and TLS handshake each time; route it through one keep-alive Session"""
+    myrequests = getattr(cdx_toolkit, 'myrequests', None)
+    if myrequests is None or getattr(myrequests, 'requests', None) is not requests:
+        return
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    myrequests.requests = types.SimpleNamespace(get=session.get, exceptions=requests.exceptions)
+
+
+def make_cdx_fetcher(pool_size):
+    """One fetcher and one pooled HTTP session for every TLD worker: building a
+    fetcher re-reads the collection list"""
+    share_cdx_session(pool_size)
+    return cdx_toolkit.CDXFetcher(source='cc')
+
+
+def capture_fields(captures):
+    """Each capture's field dict: CaptureObject.get is the Python-level
+    Mapping.get, so the dict is read directly"""
+    return (getattr(obj, 'data', obj) for obj in captures)
+
+
+# requests/http.client connection errors are OSError subclasses
+NET_ERRORS = (ConnectionError, TimeoutError, OSError)
+
+
+def is_net_error(e):
+    """cdx_toolkit retries requests' connection errors and timeouts itself; once
+    it gives up it raises ValueError('N failures for url ...') instead"""
+    return isinstance(e, NET_ERRORS) or (isinstance(e, ValueError) and 'failures for url' in str(e))
@@ -5,14 +5,49 @@ Auto-saves progress to SQLite, enables resume after crashes
 """
 
 import sqlite3
+import csv
 import json
 import time
 import threading
+from collections import Counter
 from pathlib import Path
 from datetime import datetime
 
 
 class CheckpointManager:
+    _SQL_UPSERT_DOMAIN = '''
+        INSERT INTO domains (domain, tld, country, is_ecommerce, cms, timestamp, language, url_count)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(domain) DO UPDATE SET
+            url_count = url_count + ?,
+            cms = COALESCE(NULLIF(excluded.cms, ''), cms),
+            is_ecommerce = MAX(is_ecommerce, excluded.is_ecommerce)
+    '''
+    _SQL_SAVE_METADATA = 'INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)'
+    _SQL_SAVE_TLD_PROGRESS = '''
+        INSERT OR REPLACE INTO tld_progress 
+        (tld, urls_scanned, domains_found, completed, last_url, last_timestamp)
+        VALUES (?, ?, ?, ?, ?, ?)
+    '''
+    _SQL_SAVE_STATS = '''
+        INSERT OR REPLACE INTO stats 
+        (id, total_urls, total_domains, ecommerce_count, skipped, 
+         live_checked, live_detected, start_time, domains_by_tld, cms_counts, live_platforms)
+        VALUES (1, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    '''
+    _SQL_CREATE_DOMAINS = '''
+        CREATE TABLE IF NOT EXISTS {table} (
+            domain TEXT PRIMARY KEY,
+            tld TEXT,
+            country TEXT,
+            is_ecommerce INTEGER,
+            cms TEXT,
+            timestamp TEXT,
+            language TEXT,
+            url_count INTEGER DEFAULT 1
+        ) WITHOUT ROWID
+    '''
+    
     def __init__(self, db_path, save_interval_domains=1000, save_interval_seconds=60):
         self.db_path = Path(db_path)
         self.save_interval_domains = save_interval_domains
@@ -21,13 +56,29 @@ class CheckpointManager:
         self.last_save_time = time.time()
         self.domains_since_save = 0
         self.conn = None
+        self._readers = threading.local()
+        self._reader_lock = threading.Lock()
+        self._reader_conns = []
+        self._pending_domains = []
+        self._writer = None  # ident of the thread whose writes are buffered or in flight
+        self._known = None
         self._init_db()
     
     def _init_db(self):
-        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        # isolation_level=None: we issue BEGIN/COMMIT ourselves so writes batch up
+        self.conn = sqlite3.connect(
+            str(self.db_path), check_same_thread=False, isolation_level=None, cached_statements=1024
+        )
         self.conn.execute('PRAGMA journal_mode=WAL')
         self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('PRAGMA temp_store=MEMORY')
+        self.conn.execute('PRAGMA mmap_size=10737418240')
+        self.conn.execute('PRAGMA cache_size=-65536')
+        self.conn.execute('PRAGMA busy_timeout=30000')
+        self.conn.execute('PRAGMA wal_autocheckpoint=10000')
         
+        self._migrate_domains()
+        self.conn.execute(self._SQL_CREATE_DOMAINS.format(table='domains'))
         self.conn.executescript('''
             CREATE TABLE IF NOT EXISTS metadata (
                 key TEXT PRIMARY KEY,
@@ -43,17 +94,6 @@ class CheckpointManager:
                 last_timestamp TEXT
             );
             
-            CREATE TABLE IF NOT EXISTS domains (
-                domain TEXT PRIMARY KEY,
-                tld TEXT,
-                country TEXT,
-                is_ecommerce INTEGER,
-                cms TEXT,
-                timestamp TEXT,
-                language TEXT,
-                url_count INTEGER DEFAULT 1
-            );
-            
             CREATE TABLE IF NOT EXISTS stats (
                 id INTEGER PRIMARY KEY CHECK (id = 1),
                 total_urls INTEGER DEFAULT 0,
@@ -72,35 +112,94 @@ class CheckpointManager:
         ''')
         self.conn.commit()
     
+    def _migrate_domains(self):
+        """Rebuild a domains table from before WITHOUT ROWID, keeping its rows"""
+        row = self.conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'domains'"
+        ).fetchone()
+        if not row or 'WITHOUT ROWID' in row[0].upper():
+            return
+        self.conn.execute('BEGIN IMMEDIATE')
+        self.conn.execute('DROP TABLE IF EXISTS domains_new')
+        self.conn.execute(self._SQL_CREATE_DOMAINS.format(table='domains_new'))
+        self.conn.execute('''
+            INSERT OR IGNORE INTO domains_new (domain, tld, country, is_ecommerce, cms, timestamp, language, url_count)
+            SELECT domain, tld, country, is_ecommerce, cms, timestamp, language, url_count FROM domains
+            WHERE domain IS NOT NULL
+        ''')
+        self.conn.execute('DROP TABLE domains')
+        self.conn.execute('ALTER TABLE domains_new RENAME TO domains')
+        self.conn.commit()
+    
+    def _reader(self):
+        """This thread's read-only connection; under WAL it reads the last
+        committed snapshot without waiting on self.lock or the writer"""
+        conn = getattr(self._readers, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False, cached_statements=1024)
+            conn.execute('PRAGMA query_only=1')
+            conn.execute('PRAGMA temp_store=MEMORY')
+            conn.execute('PRAGMA mmap_size=10737418240')
+            conn.execute('PRAGMA cache_size=-65536')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._readers.conn = conn
+            with self._reader_lock:
+                self._reader_conns.append(conn)
+        return conn
+    
+    def _sync_reads(self):
+        """Reader connections only see committed data; commit buffered or
+        in-flight writes first so reads see the calling thread's own writes.
+        Other threads read the last committed snapshot and leave the writer's
+        transaction alone."""
+        if self._writer != threading.get_ident():
+            return
+        if self._pending_domains or self.conn.in_transaction:
+            with self.lock:
+                if self._pending_domains or self.conn.in_transaction:
+                    self._commit()
+    
+    def _begin(self):
+        """Open a write transaction unless one is already running; caller holds self.lock"""
+        self._writer = threading.get_ident()
+        if not self.conn.in_transaction:
+            self.conn.execute('BEGIN IMMEDIATE')
+    
+    def _commit(self):
+        """Write buffered domains, then commit; caller holds self.lock"""
+        self._flush_domains()
+        self.conn.commit()
+    
     def has_checkpoint(self):
-        cursor = self.conn.execute('SELECT COUNT(*) FROM domains')
-        count = cursor.fetchone()[0]
-        return count > 0
+        self._sync_reads()
+        cursor = self._reader().execute('SELECT 1 FROM domains LIMIT 1')
+        return cursor.fetchone() is not None
     
     def save_metadata(self, key, value):
         with self.lock:
-            self.conn.execute(
-                'INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)',
-                (key, json.dumps(value))
-            )
-            self.conn.commit()
+            self._begin()
+            self.conn.execute(self._SQL_SAVE_METADATA, (key, json.dumps(value)))
+            self._commit()
     
     def get_metadata(self, key, default=None):
-        cursor = self.conn.execute('SELECT value FROM metadata WHERE key = ?', (key,))
+        self._sync_reads()
+        cursor = self._reader().execute('SELECT value FROM metadata WHERE key = ?', (key,))
         row = cursor.fetchone()
         return json.loads(row[0]) if row else default
     
-    def save_tld_progress(self, tld, urls_scanned, domains_found, completed=False, last_url='', last_timestamp=''):
+    def save_tld_progress(self, tld, urls_scanned, domains_found, completed=False, last_url='', last_timestamp='', commit=True):
         with self.lock:
-            self.conn.execute('''
-                INSERT OR REPLACE INTO tld_progress 
-                (tld, urls_scanned, domains_found, completed, last_url, last_timestamp)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (tld, urls_scanned, domains_found, 1 if completed else 0, last_url, last_timestamp))
-            self.conn.commit()
+            self._begin()
+            self.conn.execute(
+                self._SQL_SAVE_TLD_PROGRESS,
+                (tld, urls_scanned, domains_found, 1 if completed else 0, last_url, last_timestamp)
+            )
+            if commit:
+                self._commit()
     
     def get_tld_progress(self, tld):
-        cursor = self.conn.execute(
+        self._sync_reads()
+        cursor = self._reader().execute(
             'SELECT urls_scanned, domains_found, completed, last_url, last_timestamp FROM tld_progress WHERE tld = ?',
             (tld,)
         )
@@ -116,44 +215,89 @@ class CheckpointManager:
         return None
     
     def get_completed_tlds(self):
-        cursor = self.conn.execute('SELECT tld FROM tld_progress WHERE completed = 1')
+        self._sync_reads()
+        cursor = self._reader().execute('SELECT tld FROM tld_progress WHERE completed = 1')
         return {row[0] for row in cursor.fetchall()}
     
     def save_domain(self, domain, tld, country, is_ecommerce, cms, timestamp, language, url_count=1):
         with self.lock:
-            try:
-                self.conn.execute('''
-                    INSERT INTO domains (domain, tld, country, is_ecommerce, cms, timestamp, language, url_count)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    ON CONFLICT(domain) DO UPDATE SET
-                        url_count = url_count + ?,
-                        cms = COALESCE(NULLIF(excluded.cms, ''), cms),
-                        is_ecommerce = MAX(is_ecommerce, excluded.is_ecommerce)
-                ''', (domain, tld, country, 1 if is_ecommerce else 0, cms or '', timestamp, language, url_count, 1))
-                self.domains_since_save += 1
-            except sqlite3.IntegrityError:
-                pass
+            self._writer = threading.get_ident()
+            self._pending_domains.append(
+                (domain, tld, country, 1 if is_ecommerce else 0, cms or '', timestamp, language, url_count, 1)
+            )
+            self.domains_since_save += 1
+            if self._known is not None:
+                self._known.add(domain)
+            if len(self._pending_domains) >= self.save_interval_domains:
+                self._flush_domains()
+                self.conn.commit()
+    
+    def save_domains_bulk(self, rows, commit=True):
+        """Upsert many domains in one executemany and commit (commit=False leaves
+        the transaction open for the caller's commit()).
+        rows: (domain, tld, country, is_ecommerce, cms, timestamp, language, url_count, 1) tuples"""
+        with self.lock:
+            self._flush_domains()
+            if self._known is not None:
+                rows = list(rows)
+                self._known.update(row[0] for row in rows)
+            self.domains_since_save += self._write_domains(rows)
+            if commit:
+                self.conn.commit()
+    
+    def _write_domains(self, rows):
+        """Caller holds self.lock; returns number of rows written"""
+        self._begin()
+        rows = list(rows)
+        # a failed executemany keeps the rows before the bad one, so undo it and
+        # redo row by row (the upsert isn't idempotent), skipping only offenders
+        self.conn.execute('SAVEPOINT bulk')
+        try:
+            written = self.conn.executemany(self._SQL_UPSERT_DOMAIN, rows).rowcount
+        except sqlite3.IntegrityError:
+            self.conn.execute('ROLLBACK TO bulk')
+            written = 0
+            for row in rows:
+                try:
+                    self.conn.execute(self._SQL_UPSERT_DOMAIN, row)
+                    written += 1
+                except sqlite3.IntegrityError:
+                    pass
+        self.conn.execute('RELEASE bulk')
+        return written
+    
+    def _flush_domains(self):
+        """Write buffered domains in one executemany; caller holds self.lock"""
+        if not self._pending_domains:
+            return
+        self._write_domains(self._pending_domains)
+        self._pending_domains = []
     
     def domain_exists(self, domain):
-        cursor = self.conn.execute('SELECT 1 FROM domains WHERE domain = ?', (domain,))
-        return cursor.fetchone() is not None
+        """Answered from an in-memory set loaded on first call and kept current by the save methods"""
+        if self._known is None:
+            with self.lock:
+                if self._known is None:
+                    self._commit()
+                    known = self.get_all_domains()
+                    known.update(row[0] for row in self._pending_domains)
+                    self._known = known
+        return domain in self._known
     
     def get_domains_for_tld(self, tld):
-        cursor = self.conn.execute('SELECT domain FROM domains WHERE tld = ?', (tld,))
+        self._sync_reads()
+        cursor = self._reader().execute('SELECT domain FROM domains WHERE tld = ?', (tld,))
         return {row[0] for row in cursor.fetchall()}
     
     def get_all_domains(self):
-        cursor = self.conn.execute('SELECT domain FROM domains')
+        self._sync_reads()
+        cursor = self._reader().execute('SELECT domain FROM domains')
         return {row[0] for row in cursor.fetchall()}
     
-    def save_stats(self, stats):
+    def save_stats(self, stats, commit=True):
         with self.lock:
-            self.conn.execute('''
-                INSERT OR REPLACE INTO stats 
-                (id, total_urls, total_domains, ecommerce_count, skipped, 
-                 live_checked, live_detected, start_time, domains_by_tld, cms_counts, live_platforms)
-                VALUES (1, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
+            self._begin()
+            self.conn.execute(self._SQL_SAVE_STATS, (
                 stats.total_urls,
                 stats.total_domains,
                 stats.ecommerce_count,
@@ -165,10 +309,12 @@ class CheckpointManager:
                 json.dumps(stats.cms_counts),
                 json.dumps(stats.live_platforms)
             ))
-            self.conn.commit()
+            if commit:
+                self._commit()
     
     def load_stats(self, stats):
-        cursor = self.conn.execute('''
+        self._sync_reads()
+        cursor = self._reader().execute('''
             SELECT total_urls, total_domains, ecommerce_count, skipped,
                    live_checked, live_detected, start_time, domains_by_tld, cms_counts, live_platforms
             FROM stats WHERE id = 1
@@ -181,9 +327,9 @@ class CheckpointManager:
             stats.skipped = row[3]
             stats.live_checked = row[4]
             stats.live_detected = row[5]
-            stats.domains_by_tld = json.loads(row[7]) if row[7] else {}
-            stats.cms_counts = json.loads(row[8]) if row[8] else {}
-            stats.live_platforms = json.loads(row[9]) if row[9] else {}
+            stats.domains_by_tld = Counter(json.loads(row[7]) if row[7] else {})
+            stats.cms_counts = Counter(json.loads(row[8]) if row[8] else {})
+            stats.live_platforms = Counter(json.loads(row[9]) if row[9] else {})
             return True
         return False
     
@@ -196,16 +342,22 @@ class CheckpointManager:
     
     def commit(self):
         with self.lock:
+            self._flush_domains()
             self.conn.commit()
             self.last_save_time = time.time()
             self.domains_since_save = 0
     
-    def get_domain_count(self):
-        cursor = self.conn.execute('SELECT COUNT(*) FROM domains')
+    def get_domain_count(self, tld=None):
+        self._sync_reads()
+        if tld is None:
+            cursor = self._reader().execute('SELECT COUNT(*) FROM domains')
+        else:
+            cursor = self._reader().execute('SELECT COUNT(*) FROM domains WHERE tld = ?', (tld,))
         return cursor.fetchone()[0]
     
     def get_resume_info(self):
-        cursor = self.conn.execute('''
+        self._sync_reads()
+        cursor = self._reader().execute('''
             SELECT 
                 (SELECT COUNT(*) FROM domains) as domain_count,
                 (SELECT COUNT(*) FROM tld_progress WHERE completed = 1) as completed_tlds,
@@ -219,16 +371,30 @@ class CheckpointManager:
         }
     
     def export_to_csv(self, csv_path):
-        with open(csv_path, 'w', encoding='utf-8') as f:
-            f.write('domain,tld,country,is_ecommerce,cms,timestamp,language\n')
-            cursor = self.conn.execute(
-                'SELECT domain, tld, country, is_ecommerce, cms, timestamp, language FROM domains ORDER BY tld, domain'
-            )
-            for row in cursor:
-                f.write(f'{row[0]},{row[1]},{row[2]},{bool(row[3])},{row[4]},{row[5]},{row[6]}\n')
+        self.commit()
+        with open(csv_path, 'w', encoding='utf-8', newline='', buffering=1 << 20) as f:
+            writer = csv.writer(f, lineterminator='\n')
+            writer.writerow(['domain', 'tld', 'country', 'is_ecommerce', 'cms', 'timestamp', 'language'])
+            cursor = self._reader().execute('''
+                SELECT domain, tld, country,
+                       CASE WHEN is_ecommerce = 1 THEN 'True' ELSE 'False' END,
+                       cms, timestamp, language
+                FROM domains ORDER BY tld, domain
+            ''')
+            while True:
+                rows = cursor.fetchmany(10000)
+                if not rows:
+                    break
+                writer.writerows(rows)
     
     def close(self):
         if self.conn:
+            with self.lock:
+                self._flush_domains()
+            with self._reader_lock:
+                for conn in self._reader_conns:
+                    conn.close()
+                self._reader_conns = []
             self.conn.commit()
             self.conn.close()
             self.conn = None
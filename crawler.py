@@ -11,11 +11,14 @@ Usage:
 
 import sys
 import argparse
-import csv
-import re
+import json
+import types
 import threading
 import time
+import mmap
 import queue
+from array import array
+from collections import Counter
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
@@ -34,6 +37,22 @@ try:
 except ImportError:
     DETECTOR_AVAILABLE = False
 
+from cc_common import (
+    AHOCORASICK_AVAILABLE, BAD_RE, URL_AUTOMATON, build_url_automaton, classify,
+    capture_fields, extract_domain, is_net_error, make_cdx_fetcher, parse_keywords,
+)
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# cdx_toolkit json.loads()es every index line; let it use orjson's parser
+# (orjson.JSONDecodeError subclasses json's, so its except clauses still match)
+if ORJSON_AVAILABLE and getattr(cdx_toolkit, 'json', None) is json:
+    cdx_toolkit.json = types.SimpleNamespace(loads=orjson.loads, decoder=json.decoder)
+
 
 TLD_COUNTRIES = {
     'us': 'United States',
@@ -60,52 +79,31 @@ TLD_COUNTRIES = {
     'com': 'Global',
 }
 
-CMS_PATTERNS = {
-    'PrestaShop': [
-        'prestashop', '/modules/ps_', 'id_product=', 'blockcart',
-        '/themes/classic/', 'prestashop-ui-kit'
-    ],
-    'Magento': [
-        'magento', '/checkout/cart/', 'mage.', '/static/frontend/',
-        '/skin/frontend/', 'mage-'
-    ],
-    'WooCommerce': [
-        '/wp-content/plugins/woocommerce', 'wc-ajax', 'add-to-cart=',
-        'woocommerce', 'wc-block'
-    ],
-    'Shopify': [
-        '.myshopify.com', 'cdn.shopify', '/cart.js', 'shopify'
-    ],
-    'OpenCart': [
-        'route=product', 'route=checkout', 'opencart', 'catalog/view/theme'
-    ],
-    'VTEX': [
-        'vtex', '.vteximg.com', '/api/checkout', 'vtexcommercestable'
-    ],
-    'BigCommerce': [
-        'bigcommerce', 'cdn.bigcommerce.com'
-    ],
-    'Wix': [
-        'wix.com', 'wixsite.com', '_wix_'
-    ],
-    'Squarespace': [
-        'squarespace', 'static.squarespace.com'
-    ],
-}
-
-ECOMMERCE_KEYWORDS = [
-    'cart', 'checkout', 'buy', 'shop', 'store', 'product', 
-    'catalog', 'price', 'order', 'basket', 'purchase', 'payment'
-]
 
-BAD_PATTERNS = ['example.', 'test.', 'localhost']
+class StatsShard:
+    """One thread's counters; only its owner thread writes to it"""
+    __slots__ = ('counts', 'domains_by_tld', 'cms_counts', 'live_platforms')
+    
+    def __init__(self):
+        self.counts = Counter()
+        self.domains_by_tld = Counter()
+        self.cms_counts = Counter()
+        self.live_platforms = Counter()
 
 
 class Stats:
+    """Writers bump a per-thread StatsShard without locking; reduce() folds
+    every shard into the totals that progress and the summary read."""
+    __slots__ = (
+        'domains_by_tld', 'cms_counts', 'ecommerce_count', 'total_domains',
+        'total_urls', 'skipped', 'start_time', 'live_checked', 'live_detected',
+        'live_platforms', 'live_queue_size', 'live_active',
+        '_local', '_shards', '_shards_lock'
+    )
+    
     def __init__(self):
-        self.lock = threading.Lock()
-        self.domains_by_tld = {}
-        self.cms_counts = {}
+        self.domains_by_tld = Counter()
+        self.cms_counts = Counter()
         self.ecommerce_count = 0
         self.total_domains = 0
         self.total_urls = 0
@@ -114,33 +112,69 @@ class Stats:
         
         self.live_checked = 0
         self.live_detected = 0
-        self.live_platforms = {}
+        self.live_platforms = Counter()
         self.live_queue_size = 0
         self.live_active = False
+        
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+    
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = StatsShard()
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
     
     def add_domain(self, tld, cms=None, is_ecommerce=False):
-        with self.lock:
-            self.total_domains += 1
-            self.domains_by_tld[tld] = self.domains_by_tld.get(tld, 0) + 1
-            if cms:
-                self.cms_counts[cms] = self.cms_counts.get(cms, 0) + 1
-            if is_ecommerce:
-                self.ecommerce_count += 1
-    
-    def add_url(self):
-        with self.lock:
-            self.total_urls += 1
-    
-    def add_skip(self):
-        with self.lock:
-            self.skipped += 1
+        shard = self._shard()
+        shard.counts['total_domains'] += 1
+        shard.domains_by_tld[tld] += 1
+        if cms:
+            shard.cms_counts[cms] += 1
+        if is_ecommerce:
+            shard.counts['ecommerce_count'] += 1
+    
+    def merge(self, local):
+        """Fold a worker's batched url/skip counts into its shard, then reset them"""
+        self._shard().counts.update(local)
+        local.clear()
     
     def add_live_check(self, platform=None):
-        with self.lock:
-            self.live_checked += 1
-            if platform:
-                self.live_detected += 1
-                self.live_platforms[platform] = self.live_platforms.get(platform, 0) + 1
+        shard = self._shard()
+        shard.counts['live_checked'] += 1
+        if platform:
+            shard.counts['live_detected'] += 1
+            shard.live_platforms[platform] += 1
+    
+    def tld_count(self, tld):
+        with self._shards_lock:
+            shards = list(self._shards)
+        return sum(shard.domains_by_tld[tld] for shard in shards)
+    
+    def reduce(self):
+        """Recompute the totals from every shard; shards only ever grow, so
+        a snapshot taken mid-update is at worst slightly behind"""
+        with self._shards_lock:
+            shards = list(self._shards)
+        counts, by_tld, cms, platforms = Counter(), Counter(), Counter(), Counter()
+        for shard in shards:
+            counts.update(dict(shard.counts))
+            by_tld.update(dict(shard.domains_by_tld))
+            cms.update(dict(shard.cms_counts))
+            platforms.update(dict(shard.live_platforms))
+        # dict.update overwrites instead of adding, and keeps the TLDs main pre-seeded at 0
+        dict.update(self.domains_by_tld, by_tld)
+        dict.update(self.cms_counts, cms)
+        dict.update(self.live_platforms, platforms)
+        self.total_urls = counts['total_urls']
+        self.skipped = counts['skipped']
+        self.total_domains = counts['total_domains']
+        self.ecommerce_count = counts['ecommerce_count']
+        self.live_checked = counts['live_checked']
+        self.live_detected = counts['live_detected']
 
 
 def format_time(seconds):
@@ -157,7 +191,7 @@ def print_progress(stats, active_tlds, config, all_tlds=None):
     url_rate = stats.total_urls / elapsed if elapsed > 0 else 0
     live_rate = stats.live_checked / elapsed if elapsed > 0 else 0
     
-    sys.stdout.write('\033[H\033[J')
+    out = []
     
     W = 35
     G = '   '
@@ -174,11 +208,11 @@ def print_progress(stats, active_tlds, config, all_tlds=None):
     def line(left, right=''):
         left = left[:W].ljust(W)
         right = (right[:W].ljust(W)) if right else BLANK
-        print(left + G + right if stats.live_active else left)
+        out.append(left + G + right if stats.live_active else left)
     
-    print(EQ)
+    out.append(EQ)
     line('COMMON CRAWL SCANNER', 'LIVE CMS CHECKER')
-    print(EQ)
+    out.append(EQ)
     
     line(fmt('URLs Scanned:', f'{stats.total_urls:,}'), fmt('Live Checked:', f'{stats.live_checked:,}'))
     line(fmt('Domains Found:', f'{stats.total_domains:,}'), fmt('CMS Detected:', f'{stats.live_detected:,}'))
@@ -195,9 +229,9 @@ def print_progress(stats, active_tlds, config, all_tlds=None):
     if all_tlds:
         tld_list = [(t, stats.domains_by_tld.get(t, 0)) for t in all_tlds]
     else:
-        tld_list = list(sorted(stats.domains_by_tld.items(), key=lambda x: -x[1]))[:8]
+        tld_list = stats.domains_by_tld.most_common(8)
     
-    plat_list = list(sorted(stats.live_platforms.items(), key=lambda x: -x[1])) if stats.live_active else []
+    plat_list = stats.live_platforms.most_common() if stats.live_active else []
     
     max_rows = max(len(tld_list), len(plat_list), 1)
     for i in range(max_rows):
@@ -215,49 +249,52 @@ def print_progress(stats, active_tlds, config, all_tlds=None):
         
         line(left, right)
     
-    print()
+    out.append('')
+    # overwrite in place (home, erase each line's tail, erase below) so the screen never goes blank
+    sys.stdout.write('\033[H' + '\033[K\n'.join(out) + '\033[K\n\033[J')
     sys.stdout.flush()
 
 
-def extract_domain(url):
-    m = re.search(r'https?://(?:www\.)?([^/]+)', url)
-    return m.group(1).lower() if m else None
-
-
-def is_ecommerce(url, keywords):
-    u = url.lower()
-    return any(k in u for k in keywords)
-
-
-def detect_cms(url):
-    u = url.lower()
-    for cms, patterns in CMS_PATTERNS.items():
-        if any(p in u for p in patterns):
-            return cms
-    return None
-
-
-def matches_keywords(url, keywords):
-    if not keywords:
-        return True
-    u = url.lower()
-    return any(k.lower() in u for k in keywords)
+# characters that would need csv quoting in the hand-written live CSV rows
+_CSV_UNSAFE = str.maketrans({',': ';', '"': "'", '\r': ' ', '\n': ' '})
 
 
 def load_exclude_list(filepath):
     if not filepath or not Path(filepath).exists():
         return set()
-    with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-        return {line.strip().lower() for line in f if line.strip()}
+    with open(filepath, 'rb') as f:
+        try:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                data = mm[:]
+        except ValueError:  # empty file
+            return set()
+    domains = set(map(str.strip, data.decode('utf-8', errors='ignore').lower().splitlines()))
+    domains.discard('')
+    return domains
+
+
+def csv_writer_loop(csv_fh, csv_queue, flush_rows=1000, flush_interval=5):
+    """Single consumer for batches of crawl CSV lines; flushes every flush_rows lines or flush_interval seconds"""
+    pending = 0
+    last_flush = time.time()
+    while True:
+        try:
+            lines = csv_queue.get(timeout=flush_interval)
+        except queue.Empty:
+            lines = ()
+        if lines is None:
+            break
+        if lines:
+            csv_fh.writelines(lines)
+            pending += len(lines)
+        if pending and (pending >= flush_rows or time.time() - last_flush >= flush_interval):
+            csv_fh.flush()
+            pending = 0
+            last_flush = time.time()
+    csv_fh.flush()
 
 
-def collect_tld(tld, args, csv_fh, lock, stats, active_tlds, exclude_domains, config):
-    country = TLD_COUNTRIES.get(tld, 'Unknown')
-    seen = {}
-    cdx = cdx_toolkit.CDXFetcher(source='cc')
-    
-    active_tlds.add(tld)
-    
+def build_cdx_filter(args):
     cdx_filter = []
     
     if args.status:
@@ -269,10 +306,46 @@ def collect_tld(tld, args, csv_fh, lock, stats, active_tlds, exclude_domains, co
     if args.mime:
         cdx_filter.append(f'mimetype:{args.mime}')
     
+    return cdx_filter
+
+
+def collect_tld(tld, args, csv_queue, stats, active_tlds, exclude_domains, config, cdx, cdx_filter, add_domain=None):
+    """add_domain(tld, cms, ecom, domain) records a new domain; defaults to stats.add_domain"""
+    country = TLD_COUNTRIES.get(tld, 'Unknown')
+    tld_suffix = '.' + tld
+    tld_glob = f'*.{tld}/*'
+    bad_search = BAD_RE.search
+    extract = extract_domain
+    intern = sys.intern
+    keywords = config.get('keywords', [])
+    automaton = config.get('url_automaton', URL_AUTOMATON)
+    max_pages = args.pages
+    min_urls = args.min_urls
+    max_seen = args.limit * 2
+    # without --min or --keywords a domain's later URLs can't change its output
+    # row or the stats, so repeats are dropped before any classification
+    skip_repeats = min_urls <= 1 and not keywords
+    if add_domain is None:
+        def add_domain(tld, cms, ecom, domain):
+            stats.add_domain(tld, cms, ecom)
+    # per-domain fields kept as parallel arrays indexed through seen
+    seen = {}
+    counts = array('I')
+    cms_list = []
+    ecom_bits = bytearray()
+    ts_list = []
+    lang_list = []
+    local_stats = Counter()
+    rows = []
+    
+    active_tlds.add(tld)
+    
     try:
         iter_kwargs = {
             'limit': args.limit * 150,
-            'filter': cdx_filter
+            'filter': cdx_filter,
+            # only the fields collect_tld reads: smaller pages, cheaper per-line json.loads
+            'fl': 'url,timestamp,languages'
         }
         
         if args.date_from:
@@ -287,13 +360,12 @@ def collect_tld(tld, args, csv_fh, lock, stats, active_tlds, exclude_domains, co
         while retry_count < max_retries:
             try:
                 if cdx_iter is None:
-                    cdx_iter = cdx.iter(f'*.{tld}/*', **iter_kwargs)
+                    cdx_iter = cdx.iter(tld_glob, **iter_kwargs)
                 break
             except Exception as e:
                 retry_count += 1
                 print(f"\n[!] CDX init error (retry {retry_count}/{max_retries}): {e}")
                 time.sleep(5 * retry_count)
-                cdx = cdx_toolkit.CDXFetcher(source='cc')
         
         if cdx_iter is None:
             print(f"\n[!] Failed to init CDX for {tld} after {max_retries} retries")
@@ -302,113 +374,116 @@ def collect_tld(tld, args, csv_fh, lock, stats, active_tlds, exclude_domains, co
         consecutive_errors = 0
         while True:
             try:
-                for obj in cdx_iter:
+                for obj in capture_fields(cdx_iter):
                     consecutive_errors = 0
-                    stats.add_url()
+                    local_stats['total_urls'] += 1
+                    if local_stats['total_urls'] >= 1000:
+                        stats.merge(local_stats)
                     
-                    if obj.get('page', 0) > args.pages:
+                    if obj.get('page', 0) > max_pages:
                         break
                     
                     url = obj.get('url', '')
-                    domain = extract_domain(url)
+                    domain = extract(url)
                     
-                    if not domain or not domain.endswith(f'.{tld}'):
+                    if not domain or not domain.endswith(tld_suffix):
                         continue
                     
-                    if any(b in domain for b in BAD_PATTERNS):
-                        stats.add_skip()
+                    if skip_repeats and domain in seen:
                         continue
                     
                     if domain in exclude_domains:
-                        stats.add_skip()
+                        local_stats['skipped'] += 1
                         continue
                     
-                    if args.keywords and not matches_keywords(url, args.keywords.split(',')):
-                        stats.add_skip()
+                    if bad_search(domain):
+                        local_stats['skipped'] += 1
                         continue
                     
-                    ecom = is_ecommerce(url, ECOMMERCE_KEYWORDS)
-                    cms = detect_cms(url)
+                    cms, ecom, kw_ok = classify(url.lower(), automaton, keywords)
+                    
+                    if not kw_ok:
+                        local_stats['skipped'] += 1
+                        continue
                     
-                    if domain in seen:
-                        seen[domain]['count'] += 1
-                        if cms and not seen[domain]['cms']:
-                            seen[domain]['cms'] = cms
+                    i = seen.get(domain)
+                    if i is not None:
+                        counts[i] += 1
+                        if cms and not cms_list[i]:
+                            cms_list[i] = cms
                         if ecom:
-                            seen[domain]['ecom'] = True
+                            ecom_bits[i] = 1
                         continue
                     
-                    seen[domain] = {
-                        'count': 1,
-                        'cms': cms,
-                        'ecom': ecom,
-                        'timestamp': obj.get('timestamp', ''),
-                        'lang': obj.get('languages', '')
-                    }
+                    timestamp = obj.get('timestamp', '')
+                    lang = obj.get('languages', '')
+                    domain = intern(domain)
+                    seen[domain] = len(counts)
+                    counts.append(1)
+                    cms_list.append(cms or '')
+                    ecom_bits.append(1 if ecom else 0)
+                    ts_list.append(timestamp)
+                    lang_list.append(lang)
                     
-                    if args.min_urls <= 1:
-                        if hasattr(stats, 'add_domain_with_queue'):
-                            stats.add_domain_with_queue(tld, cms, ecom, domain)
-                        else:
-                            stats.add_domain(tld, cms, ecom)
+                    if min_urls <= 1:
+                        add_domain(tld, cms, ecom, domain)
                         
-                        with lock:
-                            csv_fh.write(
-                                f"{domain},{tld},{country},{ecom},{cms or ''},"
-                                f"{obj.get('timestamp','')},{seen[domain]['lang']}\n"
-                            )
-                            csv_fh.flush()
+                        rows.append(
+                            f"{domain},{tld},{country},{ecom},{cms or ''},"
+                            f"{timestamp},{lang}\n"
+                        )
+                        if len(rows) >= 256:
+                            csv_queue.put(rows)
+                            rows = []
                     
-                    if len(seen) >= args.limit * 2:
+                    if len(seen) >= max_seen:
                         break
                 break
-            except (ConnectionError, TimeoutError, OSError) as e:
+            except StopIteration:
+                break
+            except Exception as e:
+                if not is_net_error(e):
+                    break
                 consecutive_errors += 1
                 if consecutive_errors >= 5:
                     print(f"\n[!] {tld}: Too many errors, stopping. Last: {e}")
                     break
                 print(f"\n[!] {tld}: Connection error (retry {consecutive_errors}/5): {e}")
                 time.sleep(10 * consecutive_errors)
-                cdx = cdx_toolkit.CDXFetcher(source='cc')
-                cdx_iter = cdx.iter(f'*.{tld}/*', **iter_kwargs)
-            except StopIteration:
-                break
-            except Exception as e:
-                if 'RemoteDisconnected' in str(e) or 'Connection' in str(e):
-                    consecutive_errors += 1
-                    if consecutive_errors >= 5:
-                        print(f"\n[!] {tld}: Too many errors, stopping.")
-                        break
-                    print(f"\n[!] {tld}: Reconnecting ({consecutive_errors}/5)...")
-                    time.sleep(10 * consecutive_errors)
-                    cdx = cdx_toolkit.CDXFetcher(source='cc')
-                    cdx_iter = cdx.iter(f'*.{tld}/*', **iter_kwargs)
-                else:
-                    break
+                cdx_iter = cdx.iter(tld_glob, **iter_kwargs)
     
     except Exception as e:
         print(f"\n[!] {tld}: Error: {e}")
-    
-    if args.min_urls > 1:
-        for domain, data in seen.items():
-            if data['count'] >= args.min_urls:
-                if hasattr(stats, 'add_domain_with_queue'):
-                    stats.add_domain_with_queue(tld, data['cms'], data['ecom'], domain)
-                else:
-                    stats.add_domain(tld, data['cms'], data['ecom'])
+    finally:
+        stats.merge(local_stats)
+        # hand over the partial batch even if the scan died mid-TLD
+        if rows:
+            csv_queue.put(rows)
+            rows = []
+    
+    if min_urls > 1:
+        # only this worker adds domains for its TLD, so count locally
+        tld_total = stats.tld_count(tld)
+        for domain, i in seen.items():
+            if counts[i] >= min_urls:
+                cms = cms_list[i] or None
+                ecom = bool(ecom_bits[i])
+                add_domain(tld, cms, ecom, domain)
+                tld_total += 1
                 
-                with lock:
-                    csv_fh.write(
-                        f"{domain},{tld},{country},{data['ecom']},{data['cms'] or ''},"
-                        f"{data['timestamp']},{data['lang']}\n"
-                    )
-                    csv_fh.flush()
+                rows.append(
+                    f"{domain},{tld},{country},{ecom},{cms_list[i]},"
+                    f"{ts_list[i]},{lang_list[i]}\n"
+                )
                 
-                if stats.domains_by_tld.get(tld, 0) >= args.limit:
+                if tld_total >= args.limit:
                     break
     
+    if rows:
+        csv_queue.put(rows)
+    
     active_tlds.discard(tld)
-    return tld, stats.domains_by_tld.get(tld, 0)
+    return tld, stats.tld_count(tld)
 
 
 def main():
@@ -548,7 +623,12 @@ Output CSV columns:
     if args.lang:
         filters.append(f"Language: {args.lang}")
     
-    config = {'filters': filters}
+    keywords = parse_keywords(args.keywords)
+    config = {
+        'filters': filters,
+        'keywords': keywords,
+        'url_automaton': build_url_automaton(keywords) if AHOCORASICK_AVAILABLE else None
+    }
     
     output_dir = Path(args.output)
     output_dir.mkdir(parents=True, exist_ok=True)
@@ -580,111 +660,110 @@ Output CSV columns:
     print('Starting in 3 seconds...')
     time.sleep(3)
     
+    cdx = make_cdx_fetcher(args.workers)
+    cdx_filter = build_cdx_filter(args)
+    
     exclude_domains = load_exclude_list(args.exclude)
     if exclude_domains:
         print(f'Loaded {len(exclude_domains):,} domains to exclude')
     
-    csv_fh = open(crawl_csv_path, 'w', encoding='utf-8')
-    csv_fh.write('domain,tld,country,is_ecommerce,cms,timestamp,language\n')
-    csv_fh.flush()
-    
     lock = threading.Lock()
     stats = Stats()
     for t in tlds:
         stats.domains_by_tld[t] = 0
     active_tlds = set()
     
-    live_queue = queue.Queue()
+    live_executor = None
+    # caps queued + running checks so the crawl backs off when checkers lag
+    live_slots = threading.BoundedSemaphore(args.live_threads * 4)
     live_csv_fh = None
-    live_writer = None
-    crawl_done = threading.Event()
     
     if args.live_check:
         if not DETECTOR_AVAILABLE:
             print('ERROR: detector.py not found. --live-check requires detector module.')
             sys.exit(1)
         stats.live_active = True
-        live_csv_fh = open(live_csv_path, 'w', newline='', encoding='utf-8')
-        live_writer = csv.DictWriter(live_csv_fh, fieldnames=['domain', 'platform', 'status_code', 'error'])
-        live_writer.writeheader()
+        live_csv_fh = open(live_csv_path, 'w', newline='', encoding='utf-8', buffering=1 << 20)
+        live_csv_fh.write('domain,platform,status_code,error\r\n')
         live_csv_fh.flush()
     
-    def live_worker():
-        while True:
-            try:
-                domain = live_queue.get(timeout=1)
-                if domain is None:
-                    break
-                
-                try:
-                    result = check_domain(domain, args.live_timeout)
-                    platform = result.get('platform', '')
-                    stats.add_live_check(platform if platform else None)
-                    
-                    if platform and live_writer:
-                        with lock:
-                            live_writer.writerow(result)
-                            live_csv_fh.flush()
-                except Exception:
-                    stats.add_live_check(None)
-                
-                with stats.lock:
-                    stats.live_queue_size = live_queue.qsize()
-                
-                live_queue.task_done()
-            except queue.Empty:
-                if crawl_done.is_set() and live_queue.empty():
-                    break
+    def live_check(domain):
+        try:
+            result = check_domain(domain, args.live_timeout)
+            platform = result.get('platform', '')
+            stats.add_live_check(platform if platform else None)
+            
+            if platform and live_csv_fh:
+                # same layout csv.DictWriter produced; only the free-text error needs escaping
+                error = result.get('error', '').translate(_CSV_UNSAFE)
+                line = f"{domain},{platform},{result.get('status_code', '')},{error}\r\n"
+                with lock:
+                    live_csv_fh.write(line)
+        except Exception:
+            stats.add_live_check(None)
+        finally:
+            live_slots.release()
     
-    live_workers = []
     if args.live_check:
-        for _ in range(args.live_threads):
-            t = threading.Thread(target=live_worker, daemon=True)
-            t.start()
-            live_workers.append(t)
-    
-    original_add_domain = stats.add_domain
-    def add_domain_with_queue(tld, cms=None, is_ecommerce=False, domain=None):
-        original_add_domain(tld, cms, is_ecommerce)
+        live_executor = ThreadPoolExecutor(max_workers=args.live_threads, thread_name_prefix='live')
+    
+    def add_domain(tld, cms, ecom, domain):
+        stats.add_domain(tld, cms, ecom)
         if args.live_check and domain:
-            live_queue.put(domain)
-            with stats.lock:
-                stats.live_queue_size = live_queue.qsize()
-    stats.add_domain_with_queue = add_domain_with_queue
+            live_slots.acquire()
+            live_executor.submit(live_check, domain)
     
     def progress_thread():
+        last = None
         while active_tlds or stats.total_domains == 0 or (args.live_check and stats.live_queue_size > 0):
-            print_progress(stats, active_tlds, config, tlds)
-            time.sleep(2)
+            stats.reduce()
+            if args.live_check:
+                stats.live_queue_size = stats.total_domains - stats.live_checked
+            snapshot = (stats.total_urls, stats.total_domains, stats.live_checked, len(active_tlds))
+            if snapshot != last:
+                print_progress(stats, active_tlds, config, tlds)
+                last = snapshot
+            if live_csv_fh:
+                with lock:
+                    if not live_csv_fh.closed:
+                        live_csv_fh.flush()
+            time.sleep(5)
+        stats.reduce()
         print_progress(stats, active_tlds, config, tlds)
     
     progress = threading.Thread(target=progress_thread, daemon=True)
     progress.start()
     
-    with ThreadPoolExecutor(max_workers=args.workers) as ex:
-        futures = [
-            ex.submit(
-                collect_tld, tld, args, csv_fh, lock, stats, 
-                active_tlds, exclude_domains, config
-            )
-            for tld in tlds
-        ]
-        for f in as_completed(futures):
-            f.result()
+    csv_fh = open(crawl_csv_path, 'w', encoding='utf-8', buffering=1 << 20)
+    csv_fh.write('domain,tld,country,is_ecommerce,cms,timestamp,language\n')
+    csv_fh.flush()
+    csv_queue = queue.Queue(maxsize=100)
+    csv_thread = threading.Thread(target=csv_writer_loop, args=(csv_fh, csv_queue), daemon=True)
+    csv_thread.start()
     
-    crawl_done.set()
+    # rows still queued when the crawl stops (Ctrl+C, a worker error) must reach the file
+    try:
+        with ThreadPoolExecutor(max_workers=args.workers) as ex:
+            futures = [
+                ex.submit(
+                    collect_tld, tld, args, csv_queue, stats, 
+                    active_tlds, exclude_domains, config, cdx, cdx_filter, add_domain
+                )
+                for tld in tlds
+            ]
+            for f in as_completed(futures):
+                f.result()
+    finally:
+        csv_queue.put(None)
+        csv_thread.join()
+        csv_fh.close()
     
     if args.live_check:
-        live_queue.join()
-        for _ in live_workers:
-            live_queue.put(None)
-        for t in live_workers:
-            t.join(timeout=5)
+        live_executor.shutdown(wait=True)
         if live_csv_fh:
-            live_csv_fh.close()
-    
-    time.sleep(1)
-    csv_fh.close()
+            with lock:
+                live_csv_fh.close()
+    stats.reduce()
     
     print()
     print('=' * 60)
@@ -701,14 +780,14 @@ Output CSV columns:
     
     print('  DOMAINS BY TLD:')
     print('  ' + '-' * 40)
-    for tld, count in sorted(stats.domains_by_tld.items(), key=lambda x: -x[1]):
+    for tld, count in stats.domains_by_tld.most_common():
         print(f'    .{tld:12} {count:>8,}')
     print()
     
     if stats.cms_counts:
         print('  CMS DETECTED (from URL patterns):')
         print('  ' + '-' * 40)
-        for cms, count in sorted(stats.cms_counts.items(), key=lambda x: -x[1]):
+        for cms, count in stats.cms_counts.most_common():
             pct = 100 * count / stats.total_domains if stats.total_domains > 0 else 0
             print(f'    {cms:15} {count:>8,} ({pct:.1f}%)')
     print()
@@ -726,7 +805,7 @@ Output CSV columns:
         if stats.live_platforms:
             print('  LIVE PLATFORMS:')
             print('  ' + '-' * 40)
-            for p, c in sorted(stats.live_platforms.items(), key=lambda x: -x[1]):
+            for p, c in stats.live_platforms.most_common():
                 pp = 100 * c / stats.live_detected if stats.live_detected > 0 else 0
                 bar_len = int(25 * c / max(stats.live_platforms.values())) if stats.live_platforms else 0
                 bar = '▓' * bar_len
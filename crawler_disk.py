@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """
 Disk-based CDX Crawler - low memory usage with live CMS check
-Downloads chunks to disk, processes, deletes
+Streams chunks straight from the index (or downloads to disk for rapidgzip), processes, deletes
 """
 
 import sys
@@ -15,14 +15,34 @@ import os
 import csv
 import queue
 from pathlib import Path
+from contextlib import contextmanager, ExitStack
 from collections import defaultdict
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 
 try:
     from checkpoint import CheckpointManager
 except ImportError:
     CheckpointManager = None
 
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+try:
+    import rapidgzip
+    RAPIDGZIP_AVAILABLE = True
+except ImportError:
+    RAPIDGZIP_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
 try:
     from detector import check_domain
     DETECTOR_AVAILABLE = True
@@ -40,6 +60,11 @@ TLD_COUNTRIES = {
 
 ECOMMERCE_KW = ['cart', 'checkout', 'shop', 'store', 'product', 'buy', 'order']
 BAD_PATTERNS = ['example.', 'test.', 'localhost', '.gov.', '.edu.']
+CHECKPOINT_BATCH = 5000
+
+_BAD_RE = re.compile('|'.join(map(re.escape, BAD_PATTERNS)))
+_CHUNK_RE = re.compile(r'cdx-(\d+)\.gz')
+_ECOM_RE = re.compile('|'.join(map(re.escape, ECOMMERCE_KW)), re.IGNORECASE)
 
 
 class Stats:
@@ -59,6 +84,7 @@ class Stats:
         self.live_platforms = {}
         self.live_queue_size = 0
         self.live_active = False
+        self.disk_bytes = 0  # downloaded chunks waiting in the cache for their scan
     
     @property
     def total_lines(self):
@@ -72,12 +98,12 @@ class Stats:
     def start(self):
         return self.start_time
     
-    def add(self, tld, ecom=False):
+    def add_counts(self, counts, ecom=0):
         with self.lock:
-            self.total_domains += 1
-            self.domains_by_tld[tld] = self.domains_by_tld.get(tld, 0) + 1
-            if ecom:
-                self.ecommerce_count += 1
+            for tld, n in counts.items():
+                self.domains_by_tld[tld] = self.domains_by_tld.get(tld, 0) + n
+                self.total_domains += n
+            self.ecommerce_count += ecom
     
     def add_lines(self, n):
         with self.lock:
@@ -108,7 +134,7 @@ def find_chunks_for_tlds(tlds, cache_path=None):
         with open(cache_path, 'r') as f:
             lines = f.readlines()
     else:
-        resp = requests.get(f"{CC_BASE}/cluster.idx", timeout=120)
+        resp = http_session().get(f"{CC_BASE}/cluster.idx", timeout=120)
         resp.raise_for_status()
         lines = resp.text.strip().split('\n')
         if cache_path:
@@ -119,16 +145,15 @@ def find_chunks_for_tlds(tlds, cache_path=None):
     print(f"  Loaded {len(lines):,} cluster entries")
     
     tld_chunks = defaultdict(set)
-    chunk_pattern = re.compile(r'cdx-(\d+)\.gz')
+    tld_prefixes = {f"{tld},": tld for tld in tlds}
+    chunk_search = _CHUNK_RE.search
     
     for line in lines:
-        for tld in tlds:
-            if line.startswith(f"{tld},"):
-                match = chunk_pattern.search(line)
-                if match:
-                    chunk_id = int(match.group(1))
-                    tld_chunks[tld].add(chunk_id)
-                break
+        tld = tld_prefixes.get(line[:line.find(',') + 1])
+        if tld:
+            match = chunk_search(line)
+            if match:
+                tld_chunks[tld].add(int(match.group(1)))
     
     all_chunks = set()
     for tld in tlds:
@@ -143,19 +168,32 @@ def find_chunks_for_tlds(tlds, cache_path=None):
 
 
 def extract_domain_from_url(url):
-    try:
-        if '://' in url:
-            url = url.split('://', 1)[1]
-        domain = url.split('/')[0].split(':')[0].lower()
-        if domain.startswith('www.'):
-            domain = domain[4:]
-        return domain if '.' in domain else None
-    except:
-        return None
+    p = url.find('://')
+    start = p + 3 if p >= 0 else 0
+    end = url.find('/', start)
+    host = url[start:end] if end >= 0 else url[start:]
+    colon = host.find(':')
+    if colon >= 0:
+        host = host[:colon]
+    host = host.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    return host if '.' in host else None
+
+
+_session = None
+
+
+def http_session():
+    """One keep-alive Session per process, reused for every chunk it fetches"""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+    return _session
 
 
 def download_to_disk(url, dest_path):
-    resp = requests.get(url, stream=True, timeout=300)
+    resp = http_session().get(url, stream=True, timeout=300)
     resp.raise_for_status()
     
     with open(dest_path, 'wb') as f:
@@ -164,142 +202,249 @@ def download_to_disk(url, dest_path):
                 f.write(chunk)
 
 
-def process_chunk_from_disk(chunk_path, tld_prefixes, stats, seen, checkpoint, limit, lock, live_queue):
-    counts = {tld: 0 for tld in tld_prefixes.values()}
-    batch = []
+def iter_blocks(f, block_size=4 << 20):
+    """Yield ~block_size runs of whole newline-terminated lines from a binary stream"""
+    tail = b''
+    while True:
+        buf = f.read(block_size)
+        if not buf:
+            break
+        buf = tail + buf
+        cut = buf.rfind(b'\n') + 1
+        tail = buf[cut:]
+        if cut:
+            yield buf[:cut]
+    if tail:
+        yield tail + b'\n'
+
+
+@contextmanager
+def open_chunk(chunk_path, parallelization=1):
+    with rapidgzip.open(str(chunk_path), parallelization=parallelization) as f:
+        yield iter_blocks(f)
+
+
+@contextmanager
+def stream_chunk(url):
+    with http_session().get(url, stream=True, timeout=300) as resp:
+        resp.raise_for_status()
+        resp.raw.decode_content = False
+        with gzip.GzipFile(fileobj=resp.raw) as f:
+            yield iter_blocks(f)
+
+
+@contextmanager
+def read_cached_chunk(paths):
+    def blocks():
+        dctx = zstandard.ZstdDecompressor()
+        for path in paths:
+            with open(path, 'rb') as fh, dctx.stream_reader(fh) as reader:
+                yield from iter_blocks(reader)
+    yield blocks()
+
+
+def cdx_field(record, key):
+    """Raw bytes of a string field in a CDX JSON record, or None; key includes the opening quote"""
+    i = record.find(key)
+    if i < 0:
+        return None
+    i += len(key)
+    return record[i:record.find(b'"', i)]
+
+
+def scan_chunk_lines(source, tld_prefixes, cache=None):
+    """Filter one chunk's index lines; returns (lines read, rows deduped within the chunk).
+    cache: optional {tld: writer} that receives every line passing the bytes prefilter"""
+    rows = []
+    chunk_seen = set()
     lines_count = 0
-    
-    with gzip.open(chunk_path, 'rt', encoding='utf-8', errors='ignore') as f:
-        for line in f:
-            lines_count += 1
-            try:
-                line_str = line.strip()
-                
-                matched_tld = None
-                for prefix, tld in tld_prefixes.items():
-                    if line_str.startswith(prefix):
-                        matched_tld = tld
-                        break
-                
+    # bind the per-line callables once; the loop body runs for every index line
+    get_tld = tld_prefixes.get
+    prefixes = tuple(tld_prefixes)
+    needles = [b'\n' + p for p in prefixes]
+    loads = json_loads
+    field = cdx_field
+    extract = extract_domain_from_url
+    bad_search = _BAD_RE.search
+    ecom_search = _ECOM_RE.search
+    
+    with source as f:
+        for block in f:
+            lines_count += block.count(b'\n')
+            # chunks are sorted by SURT, so most blocks hold no wanted TLD at all
+            if not block.startswith(prefixes) and not any(n in block for n in needles):
+                continue
+            for line in block.split(b'\n'):
+                # cheap bytes checks first; only candidate rows get decoded
+                matched_tld = get_tld(line[:line.find(b',') + 1])
                 if not matched_tld:
                     continue
-                
-                if limit > 0 and stats.domains_by_tld.get(matched_tld, 0) >= limit:
-                    continue
-                
-                parts = line_str.split(' ', 2)
-                if len(parts) < 3:
-                    continue
-                
-                surt, timestamp, json_str = parts
-                data = json.loads(json_str)
-                
-                if data.get('status') != '200':
-                    continue
-                
-                if 'html' not in data.get('mime', ''):
+                if b'"status": "200"' not in line or b'html' not in line:
                     continue
+                if cache is not None:
+                    cache[matched_tld].write(line + b'\n')
+                try:
+                    parts = line.split(b' ', 2)
+                    if len(parts) < 3:
+                        continue
                 
-                page_url = data.get('url', '')
-                domain = extract_domain_from_url(page_url)
-                
-                if not domain:
-                    continue
+                    surt, timestamp, json_str = parts
+                    # status was matched by the prefilter; slice the other fields out
+                    # directly unless the url carries a JSON escape
+                    url = field(json_str, b'"url": "')
+                    if url is not None and b'\\' not in url:
+                        mime = field(json_str, b'"mime": "')
+                        if mime is None or b'html' not in mime:
+                            continue
+                        page_url = url.decode('utf-8', 'ignore')
+                        language = (field(json_str, b'"languages": "') or b'').decode('utf-8', 'ignore')
+                    else:
+                        data = loads(json_str)
+                        if data.get('status') != '200':
+                            continue
+                        if 'html' not in data.get('mime', ''):
+                            continue
+                        page_url = data.get('url', '')
+                        language = data.get('languages', '')
                 
-                if any(b in domain for b in BAD_PATTERNS):
-                    continue
+                    domain = extract(page_url)
                 
-                with lock:
-                    if domain in seen:
+                    if not domain:
                         continue
-                    seen.add(domain)
                 
-                ecom = any(k in page_url.lower() for k in ECOMMERCE_KW)
-                stats.add(matched_tld, ecom)
-                counts[matched_tld] += 1
+                    if bad_search(domain):
+                        continue
                 
-                if live_queue is not None:
-                    live_queue.put(domain)
-                    with stats.lock:
-                        stats.live_queue_size = live_queue.qsize()
+                    if domain in chunk_seen:
+                        continue
+                    chunk_seen.add(domain)
                 
-                if checkpoint:
-                    batch.append((
-                        domain, matched_tld, 
-                        TLD_COUNTRIES.get(matched_tld, 'Unknown'),
-                        ecom, '', timestamp, data.get('languages', '')
-                    ))
-                    
-                    if len(batch) >= 200:
-                        for item in batch:
-                            checkpoint.save_domain(*item)
-                        checkpoint.commit()
-                        batch = []
+                    ecom = ecom_search(page_url) is not None
+                    rows.append((domain, matched_tld, ecom, timestamp.decode(), language))
                     
-            except Exception:
-                continue
-    
-    stats.add_lines(lines_count)
-    
-    if checkpoint and batch:
-        for item in batch:
-            checkpoint.save_domain(*item)
-        checkpoint.commit()
+                except Exception:
+                    continue
     
-    return counts
+    return lines_count, rows
 
 
-def process_chunk(chunk_id, tld_chunks, stats, seen, checkpoint, limit, lock, temp_dir, live_queue):
-    url = f"{CC_BASE}/cdx-{chunk_id:05d}.gz"
-    
-    tlds_in_chunk = [tld for tld, chunks in tld_chunks.items() if chunk_id in chunks]
-    if not tlds_in_chunk:
-        with stats.lock:
-            stats.chunks_done += 1
+def chunk_file(url, temp_dir):
+    return Path(temp_dir) / url.rsplit('/', 1)[-1]
+
+
+def chunk_cache_paths(url, tlds_in_chunk, temp_dir):
+    """Per-TLD zstd files holding a chunk's prefiltered lines ({} without zstandard).
+    Named after CC_INDEX so a newer crawl never reads an older one's lines."""
+    if not ZSTD_AVAILABLE:
         return {}
+    stem = chunk_file(url, temp_dir).name[:-len('.gz')]
+    return {tld: Path(temp_dir) / f"{CC_INDEX}.{stem}.{tld}.zst" for tld in tlds_in_chunk}
+
+
+def is_chunk_cached(url, tlds_in_chunk, temp_dir):
+    cache_paths = chunk_cache_paths(url, tlds_in_chunk, temp_dir)
+    return bool(cache_paths) and all(p.exists() for p in cache_paths.values())
+
+
+def scan_chunk(url, tlds_in_chunk, temp_dir, parallelization=1, downloaded=False):
+    """Runs in a worker process: fetch (unless already downloaded) and filter one chunk"""
+    tld_prefixes = {f"{tld},".encode(): tld for tld in tlds_in_chunk}
+    chunk_path = chunk_file(url, temp_dir)
     
-    tld_prefixes = {f"{tld},": tld for tld in tlds_in_chunk}
-    chunk_path = Path(temp_dir) / f"cdx-{chunk_id:05d}.gz"
+    # prefiltered lines are kept per TLD as zstd so a re-run skips the download and gunzip
+    cache_paths = chunk_cache_paths(url, tlds_in_chunk, temp_dir)
+    if not downloaded and is_chunk_cached(url, tlds_in_chunk, temp_dir):
+        return scan_chunk_lines(read_cached_chunk(list(cache_paths.values())), tld_prefixes)
     
     try:
-        download_to_disk(url, chunk_path)
-        counts = process_chunk_from_disk(chunk_path, tld_prefixes, stats, seen, checkpoint, limit, lock, live_queue)
+        if RAPIDGZIP_AVAILABLE:
+            if not downloaded:
+                download_to_disk(url, chunk_path)
+            source = open_chunk(chunk_path, parallelization)
+        else:
+            source = stream_chunk(url)
+        if not cache_paths:
+            return scan_chunk_lines(source, tld_prefixes)
+        
+        with ExitStack() as stack:
+            # one compressor per writer: a ZstdCompressor drives a single stream at a time
+            cache = {
+                tld: stack.enter_context(zstandard.ZstdCompressor(level=3).stream_writer(
+                    stack.enter_context(open(f"{p}.tmp", 'wb'))))
+                for tld, p in cache_paths.items()
+            }
+            result = scan_chunk_lines(source, tld_prefixes, cache)
+        for p in cache_paths.values():
+            os.replace(f"{p}.tmp", p)
+        return result
     finally:
+        # a scan that failed part-way leaves its .tmp files behind; renamed ones are already gone
+        for p in cache_paths.values():
+            Path(f"{p}.tmp").unlink(missing_ok=True)
         if chunk_path.exists():
             try:
                 os.remove(chunk_path)
             except Exception:
                 pass
+
+
+def record_chunk(lines_count, rows, stats, seen, checkpoint, limit, live_queue):
+    """Runs in the main process: dedupe a scanned chunk's rows across chunks and record them"""
+    counts = {}
+    room = {}
+    ecom_count = 0
+    batch = []
+    seen_add = seen.add
+    by_tld = stats.domains_by_tld
+    
+    for domain, tld, ecom, timestamp, language in rows:
+        left = room.get(tld)
+        if left is None:
+            left = limit - by_tld.get(tld, 0) if limit > 0 else len(rows)
+        if left <= 0:
+            continue
+        if domain in seen:
+            continue
+        seen_add(domain)
+        
+        room[tld] = left - 1
+        counts[tld] = counts.get(tld, 0) + 1
+        if ecom:
+            ecom_count += 1
+        
+        if live_queue is not None:
+            live_queue.put(domain)
+        
+        if checkpoint:
+            batch.append((
+                domain, tld,
+                TLD_COUNTRIES.get(tld, 'Unknown'),
+                1 if ecom else 0, '', timestamp, language, 1, 1
+            ))
+            
+            if len(batch) >= CHECKPOINT_BATCH:
+                checkpoint.save_domains_bulk(batch)
+                batch = []
     
+    if checkpoint and batch:
+        checkpoint.save_domains_bulk(batch)
+    
+    stats.add_counts(counts, ecom_count)
+    stats.add_lines(lines_count)
     with stats.lock:
+        if live_queue is not None:
+            stats.live_queue_size = live_queue.qsize()
         stats.chunks_done += 1
     
     return counts
 
 
-def get_disk_usage(temp_dir):
-    """Safe disk usage calculation"""
-    try:
-        total = 0
-        for f in list(Path(temp_dir).glob('*.gz')):
-            try:
-                if f.exists():
-                    total += f.stat().st_size
-            except (OSError, FileNotFoundError):
-                pass
-        return total / 1024 / 1024
-    except Exception:
-        return 0.0
-
-
-def print_status(stats, temp_dir, tlds):
+def print_status(stats, disk_mb, tlds):
     elapsed = time.time() - stats.start
     rate = stats.total_domains / elapsed if elapsed > 0 else 0
     line_rate = stats.total_lines / elapsed if elapsed > 0 else 0
     live_rate = stats.live_checked / elapsed if elapsed > 0 else 0
     
-    disk_mb = get_disk_usage(temp_dir)
-    
     sys.stdout.write('\033[H\033[J')
     
     W = 35
@@ -363,7 +508,7 @@ def main():
     parser = argparse.ArgumentParser(description='Disk-based CDX Crawler with Live CMS Check')
     parser.add_argument('-t', '--tld', required=True, help='TLDs comma-separated')
     parser.add_argument('-l', '--limit', type=int, default=100000, help='Limit per TLD (0=unlimited)')
-    parser.add_argument('-w', '--workers', type=int, default=3, help='Parallel downloads')
+    parser.add_argument('-w', '--workers', type=int, default=3, help='Parallel chunk worker processes')
     parser.add_argument('-o', '--output', default='output', help='Output dir')
     parser.add_argument('-c', '--cache-size', type=int, default=5, help='Max chunks cached on disk')
     parser.add_argument('--live-check', action='store_true', help='Enable live CMS detection')
@@ -371,6 +516,7 @@ def main():
     parser.add_argument('--live-timeout', type=int, default=10, help='Timeout for live requests')
     parser.add_argument('--resume', action='store_true', help='Resume from checkpoint')
     parser.add_argument('--list-chunks', action='store_true', help='Just list chunks')
+    parser.add_argument('--clear-cache', action='store_true', help='Delete cached zstd chunk lines before starting')
     args = parser.parse_args()
     
     tlds = [t.strip() for t in args.tld.split(',')]
@@ -380,7 +526,9 @@ def main():
     temp_dir = output_dir / 'chunk_cache'
     temp_dir.mkdir(exist_ok=True)
     
-    for old_chunk in temp_dir.glob('*.gz'):
+    # cached lines from other crawls (or all of them with --clear-cache) are never read again
+    stale = [f for f in temp_dir.glob('*.zst') if args.clear_cache or not f.name.startswith(f"{CC_INDEX}.")]
+    for old_chunk in [*temp_dir.glob('*.gz'), *temp_dir.glob('*.zst.tmp'), *stale]:
         try:
             old_chunk.unlink()
         except:
@@ -409,8 +557,9 @@ def main():
         stats.domains_by_tld[t] = 0
     
     seen = set()
-    lock = threading.Lock()
-    semaphore = threading.Semaphore(args.cache_size)
+    # each worker process holds at most one chunk on disk
+    workers = max(1, min(args.workers, args.cache_size))
+    parallelization = max(1, (os.cpu_count() or 1) // workers)
     
     if args.resume and checkpoint:
         seen = checkpoint.get_all_domains()
@@ -421,6 +570,7 @@ def main():
     live_queue = None
     live_csv_fh = None
     live_writer = None
+    live_lock = threading.Lock()
     live_workers = []
     crawl_done = threading.Event()
     
@@ -431,7 +581,7 @@ def main():
             stats.live_active = True
             live_queue = queue.Queue()
             live_csv_path = output_dir / 'live_detected.csv'
-            live_csv_fh = open(live_csv_path, 'a', newline='', encoding='utf-8')
+            live_csv_fh = open(live_csv_path, 'a', newline='', encoding='utf-8', buffering=1 << 20)
             live_writer = csv.writer(live_csv_fh)
             if live_csv_path.stat().st_size == 0:
                 live_writer.writerow(['domain', 'platform', 'version', 'check_time'])
@@ -446,12 +596,14 @@ def main():
                         platform = result.get('platform') if result else None
                         stats.add_live_check(platform)
                         if platform and live_writer:
-                            live_writer.writerow([
+                            row = [
                                 domain, platform,
                                 result.get('version', ''),
                                 time.strftime('%Y-%m-%d %H:%M:%S')
-                            ])
-                            live_csv_fh.flush()
+                            ]
+                            # buffered; status_thread flushes once a second
+                            with live_lock:
+                                live_writer.writerow(row)
                         with stats.lock:
                             stats.live_queue_size = live_queue.qsize()
                         live_queue.task_done()
@@ -468,9 +620,20 @@ def main():
     running = [True]
     
     def status_thread():
+        last = None
         while running[0]:
             try:
-                print_status(stats, temp_dir, tlds)
+                # redraw only when something moved; workers never wait on the display
+                disk_mb = stats.disk_bytes / 1024 / 1024
+                snap = (stats.total_urls, stats.total_domains, stats.chunks_done,
+                        stats.live_checked, stats.live_queue_size, disk_mb)
+                if snap != last:
+                    print_status(stats, disk_mb, tlds)
+                    last = snap
+                if live_csv_fh:
+                    with live_lock:
+                        if not live_csv_fh.closed:
+                            live_csv_fh.flush()
             except Exception:
                 pass
             time.sleep(1)
@@ -479,25 +642,72 @@ def main():
     status_t.start()
     
     print(f"\nLimit: {args.limit:,} per TLD" if args.limit > 0 else "\nNo limit per TLD")
-    print(f"Workers: {args.workers}")
+    print(f"Workers: {workers}")
     if args.live_check and DETECTOR_AVAILABLE:
         print(f"Live threads: {args.live_threads}")
     print("\nStarting crawl...\n")
     time.sleep(2)
     
-    def worker(chunk_id):
-        with semaphore:
-            return process_chunk(chunk_id, tld_chunks, stats, seen, checkpoint, args.limit, lock, temp_dir, live_queue)
+    def open_tlds(chunk_id):
+        return [tld for tld, ids in tld_chunks.items()
+                if chunk_id in ids and not (args.limit > 0 and stats.domains_by_tld.get(tld, 0) >= args.limit)]
     
+    # chunks are parsed in worker processes (the per-line work holds the GIL);
+    # this process dedupes, counts and writes, so submission is kept to a small
+    # window and TLDs that hit their limit are dropped from later chunks.
+    # When chunks go through disk (rapidgzip), a thread pool downloads ahead so
+    # the parse processes never sit idle on the network; the window bounds the cache.
+    window = args.cache_size if RAPIDGZIP_AVAILABLE else workers * 2
     try:
-        with ThreadPoolExecutor(max_workers=args.workers) as ex:
-            futures = [ex.submit(worker, cid) for cid in chunks]
-            
-            for f in as_completed(futures):
-                try:
-                    f.result()
-                except Exception as e:
-                    print(f"\n[!] Error: {e}")
+        ctx = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as ex, \
+                ThreadPoolExecutor(max_workers=workers, thread_name_prefix='download') as dl_pool:
+            pending = iter(chunks)
+            futures = {}  # download futures map to (url, tlds); scan futures to the bytes they free
+            while True:
+                while len(futures) < window:
+                    chunk_id = next(pending, None)
+                    if chunk_id is None:
+                        break
+                    tlds_in_chunk = open_tlds(chunk_id)
+                    if not tlds_in_chunk:
+                        with stats.lock:
+                            stats.chunks_done += 1
+                        continue
+                    url = f"{CC_BASE}/cdx-{chunk_id:05d}.gz"
+                    if RAPIDGZIP_AVAILABLE and not is_chunk_cached(url, tlds_in_chunk, temp_dir):
+                        f = dl_pool.submit(download_to_disk, url, chunk_file(url, temp_dir))
+                        futures[f] = (url, tlds_in_chunk)
+                    else:
+                        futures[ex.submit(scan_chunk, url, tlds_in_chunk, str(temp_dir), parallelization)] = 0
+                
+                if not futures:
+                    break
+                
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for f in done:
+                    job = futures.pop(f)
+                    try:
+                        if isinstance(job, tuple):
+                            url, tlds_in_chunk = job
+                            path = chunk_file(url, temp_dir)
+                            try:
+                                f.result()
+                            except Exception:
+                                path.unlink(missing_ok=True)
+                                raise
+                            # scan_chunk removes the file, so the status line counts
+                            # it from here until that scan comes back
+                            size = path.stat().st_size
+                            f = ex.submit(scan_chunk, url, tlds_in_chunk, str(temp_dir), parallelization, True)
+                            futures[f] = size
+                            stats.disk_bytes += size
+                            continue
+                        stats.disk_bytes -= job
+                        lines_count, rows = f.result()
+                        record_chunk(lines_count, rows, stats, seen, checkpoint, args.limit, live_queue)
+                    except Exception as e:
+                        print(f"\n[!] Error: {e}")
                     
     except KeyboardInterrupt:
         print("\n\n[!] Interrupted - saving checkpoint...")
@@ -511,7 +721,8 @@ def main():
         for t in live_workers:
             t.join(timeout=5)
         if live_csv_fh:
-            live_csv_fh.close()
+            with live_lock:
+                live_csv_fh.close()
     
     running[0] = False
     time.sleep(0.5)
@@ -527,7 +738,7 @@ def main():
         checkpoint.export_to_csv(output_dir / 'crawl_domains.csv')
         checkpoint.close()
     
-    print_status(stats, temp_dir, tlds)
+    print_status(stats, stats.disk_bytes / 1024 / 1024, tlds)
     print("=" * 73)
     print(" DONE ".center(73))
     print("=" * 73)
@@ -11,12 +11,12 @@ Usage:
 import sys
 import argparse
 import csv
-import re
 import threading
 import time
 import queue
 import atexit
 import signal
+from collections import Counter
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
@@ -42,6 +42,11 @@ except ImportError:
     CHECKPOINT_AVAILABLE = False
     print("Warning: checkpoint.py not found, running without resume support")
 
+from cc_common import (
+    AHOCORASICK_AVAILABLE, BAD_RE, URL_AUTOMATON, build_url_automaton, classify,
+    capture_fields, extract_domain, is_net_error, make_cdx_fetcher, parse_keywords,
+)
+
 
 TLD_COUNTRIES = {
     'us': 'United States', 'ch': 'Switzerland', 'co.uk': 'United Kingdom',
@@ -53,27 +58,12 @@ TLD_COUNTRIES = {
     'store': 'Generic', 'shop': 'Generic', 'online': 'Generic', 'com': 'Global',
 }
 
-CMS_PATTERNS = {
-    'PrestaShop': ['prestashop', '/modules/ps_', 'id_product=', 'blockcart', '/themes/classic/', 'prestashop-ui-kit'],
-    'Magento': ['magento', '/checkout/cart/', 'mage.', '/static/frontend/', '/skin/frontend/', 'mage-'],
-    'WooCommerce': ['/wp-content/plugins/woocommerce', 'wc-ajax', 'add-to-cart=', 'woocommerce', 'wc-block'],
-    'Shopify': ['.myshopify.com', 'cdn.shopify', '/cart.js', 'shopify'],
-    'OpenCart': ['route=product', 'route=checkout', 'opencart', 'catalog/view/theme'],
-    'VTEX': ['vtex', '.vteximg.com', '/api/checkout', 'vtexcommercestable'],
-    'BigCommerce': ['bigcommerce', 'cdn.bigcommerce.com'],
-    'Wix': ['wix.com', 'wixsite.com', '_wix_'],
-    'Squarespace': ['squarespace', 'static.squarespace.com'],
-}
-
-ECOMMERCE_KEYWORDS = ['cart', 'checkout', 'buy', 'shop', 'store', 'product', 'catalog', 'price', 'order', 'basket', 'purchase', 'payment']
-BAD_PATTERNS = ['example.', 'test.', 'localhost']
-
 
 class Stats:
     def __init__(self):
         self.lock = threading.Lock()
-        self.domains_by_tld = {}
-        self.cms_counts = {}
+        self.domains_by_tld = Counter()
+        self.cms_counts = Counter()
         self.ecommerce_count = 0
         self.total_domains = 0
         self.total_urls = 0
@@ -81,7 +71,7 @@ class Stats:
         self.start_time = time.time()
         self.live_checked = 0
         self.live_detected = 0
-        self.live_platforms = {}
+        self.live_platforms = Counter()
         self.live_queue_size = 0
         self.live_active = False
         self.last_checkpoint = time.time()
@@ -89,26 +79,25 @@ class Stats:
     def add_domain(self, tld, cms=None, is_ecommerce=False):
         with self.lock:
             self.total_domains += 1
-            self.domains_by_tld[tld] = self.domains_by_tld.get(tld, 0) + 1
+            self.domains_by_tld[tld] += 1
             if cms:
-                self.cms_counts[cms] = self.cms_counts.get(cms, 0) + 1
+                self.cms_counts[cms] += 1
             if is_ecommerce:
                 self.ecommerce_count += 1
     
-    def add_url(self):
+    def merge(self, local):
+        """Fold a worker's batched url/skip counts in under one lock acquire, then reset them"""
         with self.lock:
-            self.total_urls += 1
-    
-    def add_skip(self):
-        with self.lock:
-            self.skipped += 1
+            self.total_urls += local['total_urls']
+            self.skipped += local['skipped']
+        local.clear()
     
     def add_live_check(self, platform=None):
         with self.lock:
             self.live_checked += 1
             if platform:
                 self.live_detected += 1
-                self.live_platforms[platform] = self.live_platforms.get(platform, 0) + 1
+                self.live_platforms[platform] += 1
 
 
 def format_time(seconds):
@@ -120,12 +109,12 @@ def format_time(seconds):
         return f"{seconds/3600:.1f}h"
 
 
-def print_progress(stats, active_tlds, config, all_tlds=None, checkpoint_mgr=None):
+def render_progress(stats, active_tlds, config, all_tlds=None, checkpoint_mgr=None):
     elapsed = time.time() - stats.start_time
     url_rate = stats.total_urls / elapsed if elapsed > 0 else 0
     live_rate = stats.live_checked / elapsed if elapsed > 0 else 0
     
-    sys.stdout.write('\033[H\033[J')
+    out = []
     
     W = 35
     G = '   '
@@ -140,11 +129,11 @@ def print_progress(stats, active_tlds, config, all_tlds=None, checkpoint_mgr=Non
     def line(left, right=''):
         left = left[:W].ljust(W)
         right = (right[:W].ljust(W)) if right else BLANK
-        print(left + G + right if stats.live_active else left)
+        out.append(left + G + right if stats.live_active else left)
     
-    print(EQ)
+    out.append(EQ)
     line('COMMON CRAWL SCANNER v2', 'LIVE CMS CHECKER')
-    print(EQ)
+    out.append(EQ)
     
     line(fmt('URLs Scanned:', f'{stats.total_urls:,}'), fmt('Live Checked:', f'{stats.live_checked:,}'))
     line(fmt('Domains Found:', f'{stats.total_domains:,}'), fmt('CMS Detected:', f'{stats.live_detected:,}'))
@@ -185,57 +174,124 @@ def print_progress(stats, active_tlds, config, all_tlds=None, checkpoint_mgr=Non
         
         line(left, right)
     
-    print()
-    sys.stdout.flush()
+    out.append('')
+    return out
 
 
-def extract_domain(url):
-    m = re.search(r'https?://(?:www\.)?([^/]+)', url)
-    return m.group(1).lower() if m else None
+def make_progress_printer(full_every=5):
+    """Return a print_progress that rewrites only the dashboard rows that
+    changed since its previous frame, and writes nothing for an identical one.
+    Every full_every calls the whole frame is repainted, so worker messages
+    that scroll the terminal don't leave the rows misplaced for good."""
+    last_rendered = {}
+    ticks = [0]
+    
+    def print_progress(stats, active_tlds, config, all_tlds=None, checkpoint_mgr=None):
+        ticks[0] += 1
+        if ticks[0] % full_every == 0:
+            last_rendered.clear()
+        frame = dict(enumerate(render_progress(stats, active_tlds, config, all_tlds, checkpoint_mgr), 1))
+        diffs = [(r, t) for r, t in frame.items() if last_rendered.get(r) != t]
+        diffs += [(r, '') for r in last_rendered if r not in frame]
+        if not diffs:
+            return
+        head = '' if last_rendered else '\033[H\033[J'
+        sys.stdout.write(head + ''.join(f'\033[{r};0H\033[K{t}' for r, t in diffs) + f'\033[{len(frame) + 1};0H')
+        sys.stdout.flush()
+        last_rendered.clear()
+        last_rendered.update(frame)
+    
+    return print_progress
 
 
-def is_ecommerce(url, keywords):
-    u = url.lower()
-    return any(k in u for k in keywords)
+def load_exclude_list(filepath):
+    if not filepath or not Path(filepath).exists():
+        return set()
+    with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
+        return {line.strip().lower() for line in f if line.strip()}
 
 
-def detect_cms(url):
-    u = url.lower()
-    for cms, patterns in CMS_PATTERNS.items():
-        if any(p in u for p in patterns):
-            return cms
-    return None
+class DomainRec:
+    """Per-domain state kept by collect_tld while a TLD is scanned"""
+    __slots__ = ('count', 'cms', 'ecom', 'timestamp', 'lang')
+    
+    def __init__(self, cms, ecom, timestamp, lang):
+        self.count = 1
+        self.cms = cms
+        self.ecom = ecom
+        self.timestamp = timestamp
+        self.lang = lang
 
 
-def matches_keywords(url, keywords):
-    if not keywords:
-        return True
-    u = url.lower()
-    return any(k.lower() in u for k in keywords)
+def checkpoint_writer_loop(checkpoint_mgr, ckpt_queue, stats, writer_done, max_batch=64):
+    """Single consumer for checkpoint writes. Items are (rows, tld_progress) tuples;
+    everything queued at once is written in one transaction, ended by one commit.
+    Sets writer_done on exit so producers stop waiting on the queue."""
+    done = False
+    try:
+        while not done:
+            items = [ckpt_queue.get()]
+            while len(items) < max_batch:
+                try:
+                    items.append(ckpt_queue.get_nowait())
+                except queue.Empty:
+                    break
+            # a failed write must not stop the drain, or producers block on a full queue
+            for item in items:
+                if item is None:
+                    done = True
+                    continue
+                try:
+                    rows, progress = item
+                    if rows:
+                        checkpoint_mgr.save_domains_bulk(rows, commit=False)
+                    if progress:
+                        checkpoint_mgr.save_tld_progress(*progress, commit=False)
+                except Exception as e:
+                    print(f"\n[!] Checkpoint write error: {e}")
+            try:
+                checkpoint_mgr.save_stats(stats, commit=False)
+                checkpoint_mgr.commit()
+                stats.last_checkpoint = time.time()
+            except Exception as e:
+                print(f"\n[!] Checkpoint commit error: {e}")
+    finally:
+        writer_done.set()
 
 
-def load_exclude_list(filepath):
-    if not filepath or not Path(filepath).exists():
-        return set()
-    with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-        return {line.strip().lower() for line in f if line.strip()}
+def put_checkpoint(ckpt_queue, item, writer_done):
+    """Queue a checkpoint write; waits while the queue is full and only gives up
+    once the writer has exited, when nothing could save the item anyway"""
+    while not writer_done.is_set():
+        try:
+            ckpt_queue.put(item, timeout=1)
+            return True
+        except queue.Full:
+            pass
+    return False
 
 
-def collect_tld(tld, args, stats, active_tlds, exclude_domains, checkpoint_mgr, global_seen):
+def collect_tld(tld, args, stats, active_tlds, exclude_domains, checkpoint_mgr, global_seen, cdx, ckpt_queue, stop, writer_done, config):
     country = TLD_COUNTRIES.get(tld, 'Unknown')
     local_seen = {}
-    cdx = cdx_toolkit.CDXFetcher(source='cc')
+    local_stats = Counter()
+    domains_saved = 0
+    batch_rows = []
+    completed = True
     
     active_tlds.add(tld)
+    # checked after the add, so save_and_exit never sees an empty active_tlds while a worker still starts up
+    if stop.is_set():
+        active_tlds.discard(tld)
+        return tld, 0
     
     if checkpoint_mgr:
         progress = checkpoint_mgr.get_tld_progress(tld)
         if progress and progress['completed']:
             active_tlds.discard(tld)
             return tld, progress['domains_found']
-        existing = checkpoint_mgr.get_domains_for_tld(tld)
-        for d in existing:
-            local_seen[d] = {'count': 1, 'cms': None, 'ecom': False}
+        # domains already saved for this TLD are in global_seen; only their count is needed here
+        domains_saved = checkpoint_mgr.get_domain_count(tld)
     
     cdx_filter = []
     if args.status:
@@ -271,24 +327,31 @@ def collect_tld(tld, args, stats, active_tlds, exclude_domains, checkpoint_mgr,
                 retry_count += 1
                 print(f"\n[!] CDX init error (retry {retry_count}/{max_retries}): {e}")
                 time.sleep(5 * retry_count)
-                cdx = cdx_toolkit.CDXFetcher(source='cc')
         
         if cdx_iter is None:
             print(f"\n[!] Failed to init CDX for {tld} after {max_retries} retries")
             active_tlds.discard(tld)
             return tld, 0
         
-        domains_saved = len(local_seen)
-        batch_domains = []
         consecutive_errors = 0
+        last_flush = time.time()
         last_url = ''
         last_timestamp = ''
+        tld_suffix = '.' + tld
+        bad_search = BAD_RE.search
+        keywords = config['keywords']
+        automaton = config['url_automaton']
         
         while True:
             try:
-                for obj in cdx_iter:
+                for obj in capture_fields(cdx_iter):
                     consecutive_errors = 0
-                    stats.add_url()
+                    local_stats['total_urls'] += 1
+                    if local_stats['total_urls'] >= 1000:
+                        stats.merge(local_stats)
+                        if stop.is_set():
+                            completed = False
+                            break
                     
                     if obj.get('page', 0) > args.pages:
                         break
@@ -298,42 +361,35 @@ def collect_tld(tld, args, stats, active_tlds, exclude_domains, checkpoint_mgr,
                     last_timestamp = obj.get('timestamp', '')
                     domain = extract_domain(url)
                     
-                    if not domain or not domain.endswith(f'.{tld}'):
+                    if not domain or not domain.endswith(tld_suffix):
                         continue
                     
-                    if any(b in domain for b in BAD_PATTERNS):
-                        stats.add_skip()
+                    if bad_search(domain):
+                        local_stats['skipped'] += 1
                         continue
                     
                     if domain in exclude_domains:
-                        stats.add_skip()
+                        local_stats['skipped'] += 1
                         continue
                     
                     if domain in global_seen:
                         continue
                     
-                    if args.keywords and not matches_keywords(url, args.keywords.split(',')):
-                        stats.add_skip()
+                    cms, ecom, kw_ok = classify(url.lower(), automaton, keywords)
+                    if not kw_ok:
+                        local_stats['skipped'] += 1
                         continue
                     
-                    ecom = is_ecommerce(url, ECOMMERCE_KEYWORDS)
-                    cms = detect_cms(url)
-                    
-                    if domain in local_seen:
-                        local_seen[domain]['count'] += 1
-                        if cms and not local_seen[domain]['cms']:
-                            local_seen[domain]['cms'] = cms
+                    rec = local_seen.get(domain)
+                    if rec is not None:
+                        rec.count += 1
+                        if cms and not rec.cms:
+                            rec.cms = cms
                         if ecom:
-                            local_seen[domain]['ecom'] = True
+                            rec.ecom = True
                         continue
                     
-                    local_seen[domain] = {
-                        'count': 1,
-                        'cms': cms,
-                        'ecom': ecom,
-                        'timestamp': last_timestamp,
-                        'lang': obj.get('languages', '')
-                    }
+                    rec = local_seen[domain] = DomainRec(cms, ecom, last_timestamp, obj.get('languages', ''))
                     global_seen.add(domain)
                     
                     if args.min_urls <= 1:
@@ -341,82 +397,73 @@ def collect_tld(tld, args, stats, active_tlds, exclude_domains, checkpoint_mgr,
                         domains_saved += 1
                         
                         if checkpoint_mgr:
-                            checkpoint_mgr.save_domain(
-                                domain, tld, country, ecom, cms,
-                                last_timestamp, local_seen[domain]['lang']
-                            )
-                            batch_domains.append(domain)
+                            batch_rows.append((
+                                domain, tld, country, 1 if ecom else 0, cms or '',
+                                last_timestamp, rec.lang, 1, 1
+                            ))
                             
-                            if len(batch_domains) >= 500 or checkpoint_mgr.should_save():
-                                checkpoint_mgr.save_tld_progress(tld, stats.total_urls, domains_saved, False, last_url, last_timestamp)
-                                checkpoint_mgr.save_stats(stats)
-                                checkpoint_mgr.commit()
-                                stats.last_checkpoint = time.time()
-                                batch_domains = []
+                            # per-worker timer: should_save() only resets when the writer commits
+                            if len(batch_rows) >= 500 or time.time() - last_flush >= checkpoint_mgr.save_interval_seconds:
+                                stats.merge(local_stats)
+                                put_checkpoint(ckpt_queue, (batch_rows, (tld, stats.total_urls, domains_saved, False, last_url, last_timestamp)), writer_done)
+                                batch_rows = []
+                                last_flush = time.time()
+                                # the merge above resets the 1000-URL count, so check stop here too
+                                if stop.is_set():
+                                    completed = False
+                                    break
                     
                     if domains_saved >= args.limit:
                         break
                 
                 break
                 
-            except (ConnectionError, TimeoutError, OSError) as e:
+            except StopIteration:
+                break
+                
+            except Exception as e:
+                # an aborted TLD keeps completed=False so --resume scans it again
+                if not is_net_error(e):
+                    print(f"\n[!] {tld}: Unexpected error: {e}")
+                    completed = False
+                    break
                 consecutive_errors += 1
                 if consecutive_errors >= 5:
                     print(f"\n[!] {tld}: Too many errors, saving checkpoint. Last: {e}")
+                    completed = False
                     break
                 print(f"\n[!] {tld}: Connection error (retry {consecutive_errors}/5): {e}")
                 time.sleep(10 * consecutive_errors)
-                cdx = cdx_toolkit.CDXFetcher(source='cc')
                 cdx_iter = cdx.iter(f'*.{tld}/*', **iter_kwargs)
-                
-            except StopIteration:
-                break
-                
-            except Exception as e:
-                if 'RemoteDisconnected' in str(e) or 'Connection' in str(e):
-                    consecutive_errors += 1
-                    if consecutive_errors >= 5:
-                        print(f"\n[!] {tld}: Too many errors, saving checkpoint.")
-                        break
-                    print(f"\n[!] {tld}: Reconnecting ({consecutive_errors}/5)...")
-                    time.sleep(10 * consecutive_errors)
-                    cdx = cdx_toolkit.CDXFetcher(source='cc')
-                    cdx_iter = cdx.iter(f'*.{tld}/*', **iter_kwargs)
-                else:
-                    print(f"\n[!] {tld}: Unexpected error: {e}")
-                    break
         
+        stats.merge(local_stats)
         if checkpoint_mgr:
-            checkpoint_mgr.save_tld_progress(tld, stats.total_urls, domains_saved, True, last_url, last_timestamp)
-            checkpoint_mgr.save_stats(stats)
-            checkpoint_mgr.commit()
-            stats.last_checkpoint = time.time()
+            put_checkpoint(ckpt_queue, (batch_rows, (tld, stats.total_urls, domains_saved, completed, last_url, last_timestamp)), writer_done)
+            batch_rows = []
     
     except Exception as e:
         print(f"\n[!] {tld}: Error: {e}")
+        completed = False
+        stats.merge(local_stats)
         if checkpoint_mgr:
-            checkpoint_mgr.save_stats(stats)
-            checkpoint_mgr.commit()
+            put_checkpoint(ckpt_queue, (batch_rows, None), writer_done)
     
     if args.min_urls > 1:
-        for domain, data in local_seen.items():
-            if data['count'] >= args.min_urls:
-                stats.add_domain(tld, data['cms'], data['ecom'])
+        rows = []
+        for domain, rec in local_seen.items():
+            if rec.count >= args.min_urls:
+                stats.add_domain(tld, rec.cms, rec.ecom)
                 domains_saved += 1
-                
-                if checkpoint_mgr:
-                    checkpoint_mgr.save_domain(
-                        domain, tld, country, data['ecom'], data['cms'],
-                        data.get('timestamp', ''), data.get('lang', '')
-                    )
+                rows.append((
+                    domain, tld, country, 1 if rec.ecom else 0, rec.cms or '',
+                    rec.timestamp, rec.lang, 1, 1
+                ))
                 
                 if domains_saved >= args.limit:
                     break
         
         if checkpoint_mgr:
-            checkpoint_mgr.save_tld_progress(tld, stats.total_urls, domains_saved, True)
-            checkpoint_mgr.save_stats(stats)
-            checkpoint_mgr.commit()
+            put_checkpoint(ckpt_queue, (rows, (tld, stats.total_urls, domains_saved, completed)), writer_done)
     
     active_tlds.discard(tld)
     return tld, stats.domains_by_tld.get(tld, 0)
@@ -499,7 +546,8 @@ Resume mode:
             'keywords': args.keywords,
             'min_urls': args.min_urls,
         })
-    
+        checkpoint_mgr.commit()
+
     print()
     print('=' * 60)
     print(' GLOBAL E-COMMERCE DOMAIN CRAWLER v2 '.center(60))
@@ -530,10 +578,19 @@ Resume mode:
     if checkpoint_mgr:
         global_seen = checkpoint_mgr.get_all_domains()
     
-    live_queue = queue.Queue()
+    ckpt_queue = queue.Queue(maxsize=256)
+    ckpt_thread = None
+    stop = threading.Event()
+    writer_done = threading.Event()
+    if checkpoint_mgr:
+        ckpt_thread = threading.Thread(
+            target=checkpoint_writer_loop, args=(checkpoint_mgr, ckpt_queue, stats, writer_done), daemon=True
+        )
+        ckpt_thread.start()
+    
+    live_queue = queue.SimpleQueue()
     live_csv_fh = None
     live_writer = None
-    crawl_done = threading.Event()
     
     if args.live_check:
         if not DETECTOR_AVAILABLE:
@@ -541,7 +598,7 @@ Resume mode:
             sys.exit(1)
         stats.live_active = True
         live_csv_path = output_dir / 'live_detected.csv'
-        live_csv_fh = open(live_csv_path, 'a' if args.resume else 'w', newline='', encoding='utf-8')
+        live_csv_fh = open(live_csv_path, 'a' if args.resume else 'w', newline='', encoding='utf-8', buffering=1 << 20)
         live_writer = csv.DictWriter(live_csv_fh, fieldnames=['domain', 'platform', 'status_code', 'error'])
         if not args.resume:
             live_writer.writeheader()
@@ -550,27 +607,22 @@ Resume mode:
     lock = threading.Lock()
     
     def live_worker():
+        # blocks until a domain or the shutdown sentinel arrives
         while True:
+            domain = live_queue.get()
+            if domain is None:
+                break
             try:
-                domain = live_queue.get(timeout=1)
-                if domain is None:
-                    break
-                try:
-                    result = check_domain(domain, args.live_timeout)
-                    platform = result.get('platform', '')
-                    stats.add_live_check(platform if platform else None)
-                    if platform and live_writer:
-                        with lock:
-                            live_writer.writerow(result)
-                            live_csv_fh.flush()
-                except Exception:
-                    stats.add_live_check(None)
-                with stats.lock:
-                    stats.live_queue_size = live_queue.qsize()
-                live_queue.task_done()
-            except queue.Empty:
-                if crawl_done.is_set() and live_queue.empty():
-                    break
+                result = check_domain(domain, args.live_timeout)
+                platform = result.get('platform', '')
+                stats.add_live_check(platform if platform else None)
+                if platform and live_writer:
+                    # buffered; progress_thread flushes on each redraw
+                    with lock:
+                        live_writer.writerow(result)
+            except Exception:
+                stats.add_live_check(None)
+            stats.live_queue_size = live_queue.qsize()
     
     live_workers = []
     if args.live_check:
@@ -581,33 +633,62 @@ Resume mode:
     
     def save_and_exit(signum=None, frame=None):
         print("\n\n[!] Saving checkpoint and exiting...")
+        # workers stop scanning and queue their pending rows and progress; the
+        # writer keeps draining until they are done, then takes the sentinel
+        stop.set()
+        deadline = time.time() + 60
+        while active_tlds and time.time() < deadline:
+            time.sleep(0.5)
         if checkpoint_mgr:
-            checkpoint_mgr.save_stats(stats)
-            checkpoint_mgr.commit()
-            checkpoint_mgr.export_to_csv(output_dir / 'crawl_domains.csv')
-            checkpoint_mgr.close()
-            print(f"[+] Checkpoint saved: {checkpoint_path}")
-            print(f"[+] CSV exported: {output_dir / 'crawl_domains.csv'}")
+            try:
+                ckpt_queue.put(None, timeout=30)
+            except queue.Full:
+                pass
+            ckpt_thread.join(timeout=30)
+            if ckpt_thread.is_alive():
+                print("[!] Checkpoint writer still busy; last batch may be lost")
+            else:
+                checkpoint_mgr.save_stats(stats)
+                checkpoint_mgr.commit()
+                checkpoint_mgr.export_to_csv(output_dir / 'crawl_domains.csv')
+                checkpoint_mgr.close()
+                print(f"[+] Checkpoint saved: {checkpoint_path}")
+                print(f"[+] CSV exported: {output_dir / 'crawl_domains.csv'}")
         print(f"[+] Domains saved: {stats.total_domains:,}")
         print("\nUse --resume to continue from this checkpoint.")
         sys.exit(0)
     
     signal.signal(signal.SIGINT, save_and_exit)
     signal.signal(signal.SIGTERM, save_and_exit)
-    atexit.register(lambda: checkpoint_mgr.close() if checkpoint_mgr else None)
+    atexit.register(lambda: checkpoint_mgr.close() if checkpoint_mgr and not ckpt_thread.is_alive() else None)
+    
+    print_progress = make_progress_printer()
     
     def progress_thread():
         while active_tlds or stats.total_domains == 0 or (args.live_check and stats.live_queue_size > 0):
             print_progress(stats, active_tlds, {}, tlds, checkpoint_mgr)
+            if live_csv_fh:
+                with lock:
+                    if not live_csv_fh.closed:
+                        live_csv_fh.flush()
             time.sleep(2)
         print_progress(stats, active_tlds, {}, tlds, checkpoint_mgr)
     
     progress = threading.Thread(target=progress_thread, daemon=True)
     progress.start()
     
+    cdx = make_cdx_fetcher(args.workers)
+    
+    keywords = parse_keywords(args.keywords)
+    config = {
+        'keywords': keywords,
+        # user keywords ride along in the CMS/e-commerce scan
+        'url_automaton': build_url_automaton(keywords) if keywords and AHOCORASICK_AVAILABLE else URL_AUTOMATON
+    }
+    
     with ThreadPoolExecutor(max_workers=args.workers) as ex:
         futures = [
-            ex.submit(collect_tld, tld, args, stats, active_tlds, exclude_domains, checkpoint_mgr, global_seen)
+            ex.submit(collect_tld, tld, args, stats, active_tlds, exclude_domains, checkpoint_mgr, global_seen, cdx, ckpt_queue, stop, writer_done, config)
             for tld in tlds
         ]
         for f in as_completed(futures):
@@ -616,18 +697,19 @@ Resume mode:
             except Exception as e:
                 print(f"\n[!] Worker error: {e}")
     
-    crawl_done.set()
-    
     if args.live_check:
-        live_queue.join()
+        # sentinels queue up behind the remaining domains, so joining waits for the checks
         for _ in live_workers:
             live_queue.put(None)
         for t in live_workers:
-            t.join(timeout=5)
+            t.join()
         if live_csv_fh:
-            live_csv_fh.close()
+            with lock:
+                live_csv_fh.close()
     
     if checkpoint_mgr:
+        ckpt_queue.put(None)
+        ckpt_thread.join()
         checkpoint_mgr.save_stats(stats)
         checkpoint_mgr.export_to_csv(output_dir / 'crawl_domains.csv')
         checkpoint_mgr.close()
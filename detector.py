@@ -3,12 +3,20 @@ E-commerce Platform Detection Module - FIXED VERSION
 """
 import sys, argparse, re, requests, time, signal, json
 from pathlib import Path
+from collections import Counter
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from threading import Lock
+from threading import Lock, local
 import urllib3
 urllib3.disable_warnings()
 
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
 REQUEST_TIMEOUT = 10
+MAX_BODY = 128 << 10  # fingerprints sit in <head> / early body; don't pull whole pages
 HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36', 'Accept': 'text/html'}
 
 lock = Lock()
@@ -17,12 +25,27 @@ stats = {'checked': 0, 'detected': 0, 'errors': 0, 'total': 0, 'platforms': {}}
 results_list = []
 checkpoint_file = None
 output_file = None
+_tls = local()
+
+def get_session():
+    """One keep-alive Session per thread, so redirects and repeat hosts reuse their connection"""
+    s = getattr(_tls, 'session', None)
+    if s is None:
+        s = _tls.session = requests.Session()
+        s.headers.update(HEADERS)
+        s.verify = False
+        adapter = requests.adapters.HTTPAdapter(pool_connections=64, pool_maxsize=64, max_retries=0)
+        s.mount('http://', adapter)
+        s.mount('https://', adapter)
+    return s
 
 def fetch_url(url, timeout=REQUEST_TIMEOUT):
     if not url.startswith(('http://', 'https://')):
         url = 'https://' + url
     try:
-        return requests.get(url, headers=HEADERS, timeout=timeout, allow_redirects=True, verify=False), ''
+        s = get_session()
+        s.cookies.clear()  # don't let the jar grow across domains
+        return s.get(url, timeout=timeout, allow_redirects=True, stream=True), ''
     except requests.exceptions.Timeout:
         return None, 'timeout'
     except requests.exceptions.SSLError:
@@ -33,17 +56,19 @@ def fetch_url(url, timeout=REQUEST_TIMEOUT):
         return None, 'error'
 
 def detect_from_headers(headers):
-    h = {k.lower(): v.lower() for k, v in headers.items()}
-    if 'x-shopify-stage' in h or 'x-shopid' in h or h.get('server','').startswith('shopify'):
+    """headers: case-insensitive mapping (resp.headers)"""
+    keys = {k.lower() for k in headers}
+    if 'x-shopify-stage' in keys or 'x-shopid' in keys or headers.get('server', '').lower().startswith('shopify'):
         return 'Shopify'
-    if 'x-bc-' in str(h): return 'BigCommerce'
-    if 'x-magento-' in str(h): return 'Magento'
-    if 'x-dw-request-base-id' in h: return 'Demandware'
-    if 'x-wix-request-id' in h: return 'Wix'
+    if any(k.startswith('x-bc-') for k in keys): return 'BigCommerce'
+    if any(k.startswith('x-magento-') for k in keys): return 'Magento'
+    if 'x-dw-request-base-id' in keys: return 'Demandware'
+    if 'x-wix-request-id' in keys: return 'Wix'
     return ''
 
 def detect_from_cookies(cookies):
-    c = str(cookies).lower()
+    # cookie names only; str(jar) would also match values and domains
+    c = ' '.join(ck.name for ck in cookies).lower()
     if 'woocommerce_' in c: return 'WooCommerce'
     if '_shopify_' in c: return 'Shopify'
     if 'mage-' in c: return 'Magento'
@@ -52,48 +77,98 @@ def detect_from_cookies(cookies):
     if 'bitrix_' in c: return 'Bitrix'
     return ''
 
-PLATFORM_CHECKS = [
-    (lambda t: 'shopify' in t or 'cdn.shopify.com' in t or 'myshopify.com' in t, 'Shopify'),
-    (lambda t: 'woocommerce' in t or 'wc-block' in t or '/wp-content/plugins/woocommerce/' in t, 'WooCommerce'),
-    (lambda t: 'magento' in t or '/skin/frontend/' in t or '/static/frontend/' in t or 'mage.cookies' in t, 'Magento'),
-    (lambda t: 'bigcommerce' in t or 'cdn.bigcommerce.com' in t, 'BigCommerce'),
-    (lambda t: 'prestashop' in t or '/modules/ps_' in t or '/themes/classic/assets/' in t or 'blockcart' in t, 'PrestaShop'),
-    (lambda t: 'wix.com' in t or 'wixsite.com' in t or '_wix_' in t, 'Wix'),
-    (lambda t: 'squarespace' in t or 'static.squarespace.com' in t, 'Squarespace'),
-    (lambda t: 'bigcartel' in t, 'BigCartel'),
-    (lambda t: 'opencart' in t or 'index.php?route=' in t or 'catalog/view/theme' in t, 'OpenCart'),
-    (lambda t: '3dcart' in t or 'shift4shop' in t, '3DCart'),
-    (lambda t: 'volusion' in t, 'Volusion'),
-    (lambda t: 'demandware' in t or 'dwvar_' in t or 'dwfrm_' in t, 'Demandware'),
-    (lambda t: 'sellfy' in t, 'Sellfy'),
-    (lambda t: 'ecwid' in t, 'Ecwid'),
-    (lambda t: 'weebly' in t or 'editmysite.com' in t, 'Weebly'),
-    (lambda t: 'salesforce' in t and 'commerce' in t, 'SalesforceCommerce'),
-    (lambda t: 'vtex' in t, 'VTEX'),
-    (lambda t: 'shopware' in t, 'Shopware'),
-    (lambda t: 'nopcommerce' in t, 'nopCommerce'),
-    (lambda t: 'lightspeed' in t or 'seoshop' in t, 'Lightspeed'),
-    (lambda t: 'tilda' in t or 'tildacdn' in t, 'Tilda'),
-    (lambda t: 'bitrix' in t or '1c-bitrix' in t, 'Bitrix'),
-    (lambda t: 'insales' in t, 'InSales'),
-    (lambda t: 'cs-cart' in t or 'cscart' in t, 'CS-Cart'),
-]
-
-def detect_platform(text):
-    t = text.lower()
-    for check, name in PLATFORM_CHECKS:
-        try:
-            if check(t): return name
-        except: pass
-    return ''
+# checked in order, first platform wins; patterns are lowercase substrings of the page
+PLATFORM_PATTERNS = {
+    'Shopify': ['shopify', 'cdn.shopify.com', 'myshopify.com'],
+    'WooCommerce': ['woocommerce', 'wc-block', '/wp-content/plugins/woocommerce/'],
+    'Magento': ['magento', '/skin/frontend/', '/static/frontend/', 'mage.cookies'],
+    'BigCommerce': ['bigcommerce', 'cdn.bigcommerce.com'],
+    'PrestaShop': ['prestashop', '/modules/ps_', '/themes/classic/assets/', 'blockcart'],
+    'Wix': ['wix.com', 'wixsite.com', '_wix_'],
+    'Squarespace': ['squarespace', 'static.squarespace.com'],
+    'BigCartel': ['bigcartel'],
+    'OpenCart': ['opencart', 'index.php?route=', 'catalog/view/theme'],
+    '3DCart': ['3dcart', 'shift4shop'],
+    'Volusion': ['volusion'],
+    'Demandware': ['demandware', 'dwvar_', 'dwfrm_'],
+    'Sellfy': ['sellfy'],
+    'Ecwid': ['ecwid'],
+    'Weebly': ['weebly', 'editmysite.com'],
+    'SalesforceCommerce': ['salesforce', 'commerce'],
+    'VTEX': ['vtex'],
+    'Shopware': ['shopware'],
+    'nopCommerce': ['nopcommerce'],
+    'Lightspeed': ['lightspeed', 'seoshop'],
+    'Tilda': ['tilda', 'tildacdn'],
+    'Bitrix': ['bitrix', '1c-bitrix'],
+    'InSales': ['insales'],
+    'CS-Cart': ['cs-cart', 'cscart'],
+}
+# platforms that need every pattern present rather than any one
+PLATFORM_ALL_OF = {'SalesforceCommerce'}
+PLATFORM_NAMES = list(PLATFORM_PATTERNS)
+
+def build_platform_automaton():
+    """Every fingerprint in one automaton; payload is (rank, pattern), rank in PLATFORM_PATTERNS order"""
+    a = ahocorasick.Automaton()
+    for rank, patterns in enumerate(PLATFORM_PATTERNS.values()):
+        for p in patterns:
+            a.add_word(p, (rank, p))
+    a.make_automaton()
+    return a
+
+PLATFORM_AUTOMATON = build_platform_automaton() if AHOCORASICK_AVAILABLE else None
+# fallback without pyahocorasick: flat (needle, platform) pairs in priority order, as bytes;
+# an all-of platform is entered once under its first pattern and confirmed on a hit
+_NEEDLES = tuple(
+    (p.encode(), name) for name, patterns in PLATFORM_PATTERNS.items()
+    for p in (patterns[:1] if name in PLATFORM_ALL_OF else patterns)
+)
+_ALL_OF_BYTES = {n: [p.encode() for p in PLATFORM_PATTERNS[n]] for n in PLATFORM_ALL_OF}
+_ALL_OF_RANKS = {PLATFORM_NAMES.index(n): len(PLATFORM_PATTERNS[n]) for n in PLATFORM_ALL_OF}
+
+def detect_platform(body):
+    """body: raw page bytes. Fingerprints are ASCII, so an ASCII-only bytes.lower() stands
+    in for decoding the page and a Unicode-aware str.lower()"""
+    t = body.lower()
+    if PLATFORM_AUTOMATON is None:
+        for needle, name in _NEEDLES:
+            if needle in t and (name not in PLATFORM_ALL_OF or all(p in t for p in _ALL_OF_BYTES[name])):
+                return name
+        return ''
+    best = None
+    partial = {}
+    # latin-1 maps byte for byte, so the str automaton sees the same ASCII runs
+    for _, (rank, p) in PLATFORM_AUTOMATON.iter(t.decode('latin-1')):
+        if best is not None and rank >= best:
+            continue
+        if rank in _ALL_OF_RANKS:
+            hit = partial.setdefault(rank, set())
+            hit.add(p)
+            if len(hit) < _ALL_OF_RANKS[rank]:
+                continue
+        best = rank
+        if best == 0:
+            break
+    return PLATFORM_NAMES[best] if best is not None else ''
+
+def read_body(resp, limit=MAX_BODY):
+    """First `limit` bytes of a streamed response, content-decoded (gzip etc.) but not charset-decoded"""
+    return resp.raw.read(limit, decode_content=True)
 
 def check_domain(domain, timeout=REQUEST_TIMEOUT):
     resp, err = fetch_url(domain, timeout)
     if resp is None:
         return {'domain': domain, 'platform': '', 'status_code': 0, 'error': err}
-    platform = detect_from_headers(dict(resp.headers))
-    if not platform: platform = detect_from_cookies(resp.cookies)
-    if not platform: platform = detect_platform(resp.text)
+    try:
+        # headers and cookies arrive before the body; only read it if they don't decide
+        platform = detect_from_headers(resp.headers)
+        if not platform: platform = detect_from_cookies(resp.cookies)
+        if not platform: platform = detect_platform(read_body(resp))
+    except Exception:
+        return {'domain': domain, 'platform': '', 'status_code': resp.status_code, 'error': 'error'}
+    finally:
+        resp.close()
     return {'domain': domain, 'platform': platform, 'status_code': resp.status_code, 'error': ''}
 
 def save_checkpoint():
@@ -155,18 +230,24 @@ def print_stats(stats, elapsed):
 
 def process_domain(args):
     global stats, results_list, running
-    domain, timeout = args
+    # repeats: how many input lines name this domain; it is fetched once
+    domain, timeout, repeats = args
     if not running: return None
     result = check_domain(domain, timeout)
+    save_due = False
     with lock:
-        stats['checked'] += 1
-        results_list.append(result)
-        if result['error']: stats['errors'] += 1
-        if result['platform']:
-            stats['detected'] += 1
-            stats['platforms'][result['platform']] = stats['platforms'].get(result['platform'], 0) + 1
-        if stats['checked'] % 5000 == 0:
-            save_checkpoint()
+        for _ in range(repeats):
+            stats['checked'] += 1
+            results_list.append(dict(result))
+            if result['error']: stats['errors'] += 1
+            if result['platform']:
+                stats['detected'] += 1
+                stats['platforms'][result['platform']] = stats['platforms'].get(result['platform'], 0) + 1
+            if stats['checked'] % 5000 == 0:
+                save_due = True
+    # save_checkpoint takes the lock itself
+    if save_due:
+        save_checkpoint()
     return result
 
 def main():
@@ -209,14 +290,20 @@ def main():
                     if len(parts) >= 4:
                         results_list.append({'domain': parts[0], 'platform': parts[1], 'status_code': parts[2], 'error': parts[3]})
         print(f"[RESUME] Skipping {skip:,} already checked")
-        domains = domains[skip:]
+        # repeats are checked together, so drop by domain rather than by line position;
+        # the output CSV saved with the checkpoint already lists every checked domain
+        if results_list:
+            checked = {r['domain'] for r in results_list}
+            domains = [d for d in domains if d not in checked]
+        else:
+            domains = domains[skip:]
     
     stats['total'] = len(domains) + skip
     start = time.time()
     last_print = 0
     
     with ThreadPoolExecutor(max_workers=args.workers) as ex:
-        futures = [ex.submit(process_domain, (d, args.timeout)) for d in domains]
+        futures = [ex.submit(process_domain, (d, args.timeout, n)) for d, n in Counter(domains).items()]
         for f in as_completed(futures):
             if not running: break
             elapsed = time.time() - start
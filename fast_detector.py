@@ -28,6 +28,8 @@ SIGNATURES = {
         r'/pub/static/', r'checkout/cart', r'requirejs/require', r'magento\.js',
     ],
 }
+# one compiled alternation per platform, in SIGNATURES order
+SIGNATURE_RES = [(plat, re.compile('|'.join(pats), re.I)) for plat, pats in SIGNATURES.items()]
 
 def save_checkpoint():
     global results, stats, checkpoint_file
@@ -60,12 +62,9 @@ def detect(domain):
         html = resp.text[:50000]
         
         detected = None
-        for platform, patterns in SIGNATURES.items():
-            for p in patterns:
-                if re.search(p, html, re.I):
-                    detected = platform
-                    break
-            if detected:
+        for platform, sig_re in SIGNATURE_RES:
+            if sig_re.search(html):
+                detected = platform
                 break
         
         with lock: